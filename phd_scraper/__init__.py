@@ -2,6 +2,14 @@
 from pkg_resources import get_distribution, DistributionNotFound
 from . import se_historic
 from . import se_hydrometeo
+from . import cache
+from . import crawl
+from . import rollup
+from . import qc
+from . import export
+from . import planner
+from . import merge
+from . import profiling
 
 try:
     # Change here if project is renamed and does not equal the package name
@@ -0,0 +1,266 @@
+#!/usr/bin/python
+"""Caches for the SENAMHI scrapers
+This Python module keeps the parsed result of each downloaded page together with
+the content hash of the page. When SENAMHI returns the same page again (same hash),
+the stored parse is reused instead of running BeautifulSoup and complete_monthly_data.
+
+SharedCache is a single SQLite database (WAL mode) that several processes (and threads)
+can read and write at the same time. It keeps raw responses, parsed months and altitudes,
+and it is bounded by size (the least recently used entries are evicted).
+
+FUNCTIONS
+------------------------------------------------------------
+    MAIN:
+        ParseCache: Directory of parsed pages indexed by key and content hash.
+        SharedCache: SQLite cache shared by several processes (responses, parsed months, altitudes).
+
+MODE OF USE
+------------------------------------------------------------
+    >>> from phd_scraper import se_hydrometeo
+    >>> from phd_scraper.cache import ParseCache
+    >>> parse_cache = ParseCache('~/.phd_scraper/parse')
+    >>> se_hydrometeo.download(station_code='100090',
+                               init_date='2019-01-01',
+                               last_date='2019-02-02',
+                               to_csv='test.csv',
+                               parse_cache=parse_cache)
+
+    >>> from phd_scraper.cache import SharedCache
+    >>> cache = SharedCache('~/.phd_scraper/cache.sqlite', max_bytes=2 * 1024 ** 3)
+    >>> se_hydrometeo.download(station_code='100090',
+                               init_date='2019-01-01',
+                               last_date='2019-02-02',
+                               cache=cache)
+    >>> se_historic.download(station_code='152204', cache=cache)
+"""
+
+from __future__ import print_function
+
+import os
+import time
+import pickle
+import sqlite3
+import tempfile
+import threading
+
+
+class ParseCache(object):
+    '''Directory of parsed pages indexed by key and content hash.
+    Each entry is a pickle file with the tuple (payload_hash, parsed_data).
+    Args:
+    -cache_dir: Folder where the parsed pages are saved.
+    '''
+
+    def __init__(self, cache_dir):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, '%s.pickle' % key)
+
+    def get(self, key):
+        '''Return the tuple (payload_hash, parsed_data) saved for key or None.'''
+        try:
+            with open(self._path(key), 'rb') as cache_file:
+                return pickle.load(cache_file)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def put(self, key, payload_hash, data):
+        '''Save the parsed data of the page with content hash payload_hash.'''
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as cache_file:
+            pickle.dump((payload_hash, data), cache_file)
+        os.replace(tmp_path, self._path(key))
+
+
+class SharedCache(object):
+    '''SQLite cache shared by several processes (responses, parsed months, altitudes).
+    The database is opened in WAL mode, so readers do not block the writer. Each thread
+    uses its own connection. Entries are grouped by namespace:
+
+        - 'response': Raw pages (reused while they are younger than response_max_age, or
+          open_month_max_age for the current and the previous month, see se_hydrometeo.response_max_age).
+        - 'parsed': Parsed months with the content hash of their page (see ParseCache).
+        - 'altitude': Altitude of the gauge stations (reused while they are younger than altitude_max_age).
+        - 'historic': Raw pages of se_historic.
+        - 'historic_parsed': Parsed se_historic stations.
+
+    Just the pages that were downloaded without HTTP errors and parsed without errors are saved
+    (see se_hydrometeo and se_historic), so a failed month is downloaded again by the next crawl.
+
+    The total size is kept in the meta table, so put does not scan the entries. Reads do not
+    write: the access time of an entry (used to evict the least recently used ones) is recorded
+    at most once per access_interval seconds, and it is written with the next put (or flush).
+
+    Args:
+    -path: Filename of the SQLite database.
+    -max_bytes: Maximum size of the stored values. The least recently used entries are evicted.
+    -response_max_age: Seconds a raw response is reused without downloading it again.
+    -open_month_max_age: Seconds a raw response of the current or the previous month (SENAMHI still
+     adds data to them) is reused. By default 0: they are always downloaded again.
+    -altitude_max_age: Seconds an altitude is reused without downloading it again.
+    -timeout: Seconds to wait for the write lock of another process.
+    -access_interval: Seconds; Resolution of the access time of the entries.
+    '''
+
+    TOUCH_BATCH = 256
+
+    def __init__(self, path, max_bytes=1024 ** 3, response_max_age=24 * 3600, altitude_max_age=30 * 24 * 3600,
+                 timeout=60, access_interval=60, open_month_max_age=0):
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.response_max_age = response_max_age
+        self.altitude_max_age = altitude_max_age
+        self.open_month_max_age = open_month_max_age
+        self.timeout = timeout
+        self.access_interval = access_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._touched = {}
+        if os.path.dirname(self.path) and not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'namespace TEXT NOT NULL, '
+            'key TEXT NOT NULL, '
+            'hash TEXT, '
+            'value BLOB NOT NULL, '
+            'size INTEGER NOT NULL, '
+            'created REAL NOT NULL, '
+            'accessed REAL NOT NULL, '
+            'PRIMARY KEY (namespace, key))')
+        conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+        conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        # Databases created before the meta table get their total once
+        conn.execute("INSERT OR IGNORE INTO meta (name, value) "
+                     "SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM entries")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key, max_age=None):
+        '''Return the tuple (hash, value) saved for (namespace, key) or None.
+        Args:
+        -namespace, key: Entry.
+        -max_age: Seconds; Whether it is given, older entries are ignored.
+        '''
+        row = self._conn().execute('SELECT hash, value, created, accessed FROM entries '
+                                   'WHERE namespace = ? AND key = ?', (namespace, key)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if max_age is not None and now - row[2] >= max_age:
+            return None
+        if now - row[3] > self.access_interval:
+            self._touch(namespace, key, now)
+        return row[0], pickle.loads(row[1])
+
+    def contains(self, namespace, key, max_age=None):
+        '''Whether (namespace, key) is saved (and younger than max_age seconds) without reading its value.'''
+        row = self._conn().execute('SELECT created FROM entries WHERE namespace = ? AND key = ?',
+                                   (namespace, key)).fetchone()
+        return row is not None and (max_age is None or time.time() - row[0] < max_age)
+
+    def _touch(self, namespace, key, now):
+        '''Record the access time of an entry (it is written with the next put or flush).'''
+        with self._lock:
+            self._touched[(namespace, key)] = now
+            full = len(self._touched) >= self.TOUCH_BATCH
+        if full:
+            self.flush()
+
+    def _pop_touched(self):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        return [(accessed, namespace, key) for (namespace, key), accessed in touched.items()]
+
+    def flush(self):
+        '''Write the recorded access times.'''
+        touched = self._pop_touched()
+        if touched:
+            self._write(lambda conn: self._write_touched(conn, touched))
+
+    def _write(self, function):
+        '''Run function(conn) in a write transaction.'''
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = function(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return result
+
+    @staticmethod
+    def _write_touched(conn, touched):
+        conn.executemany('UPDATE entries SET accessed = MAX(accessed, ?) WHERE namespace = ? AND key = ?', touched)
+
+    def put(self, namespace, key, value, payload_hash=None):
+        '''Save value (any pickable object) as (namespace, key).'''
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        touched = self._pop_touched()
+
+        def write(conn):
+            self._write_touched(conn, touched)
+            row = conn.execute('SELECT size FROM entries WHERE namespace = ? AND key = ?',
+                               (namespace, key)).fetchone()
+            now = time.time()
+            conn.execute('INSERT OR REPLACE INTO entries (namespace, key, hash, value, size, created, accessed) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (namespace, key, payload_hash, sqlite3.Binary(blob), len(blob), now, now))
+            total = self._add_total(conn, len(blob) - (row[0] if row is not None else 0))
+            if total > self.max_bytes:
+                self._evict(conn, total - self.max_bytes)
+
+        self._write(write)
+
+    @staticmethod
+    def _add_total(conn, delta):
+        conn.execute("UPDATE meta SET value = value + ? WHERE name = 'total_bytes'", (delta,))
+        return conn.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()[0]
+
+    def _evict(self, conn, excess):
+        '''Delete the least recently used entries that free at least excess bytes.'''
+        freed = count = 0
+        cursor = conn.execute('SELECT size FROM entries ORDER BY accessed')
+        for (size,) in cursor:
+            if freed >= excess:
+                break
+            freed += size
+            count += 1
+        cursor.close()
+        conn.execute('DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY accessed LIMIT ?)',
+                     (count,))
+        self._add_total(conn, -freed)
+
+    def size(self):
+        '''Total size (bytes) of the stored values.'''
+        return self._conn().execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()[0]
+
+    def namespace(self, namespace):
+        '''View of one namespace with the ParseCache interface (get(key), put(key, payload_hash, data)).'''
+        return _CacheNamespace(self, namespace)
+
+
+class _CacheNamespace(object):
+    '''One namespace of a SharedCache with the ParseCache interface.'''
+
+    def __init__(self, cache, namespace):
+        self.cache = cache
+        self.namespace = namespace
+
+    def get(self, key):
+        return self.cache.get(self.namespace, key)
+
+    def put(self, key, payload_hash, data):
+        self.cache.put(self.namespace, key, data, payload_hash=payload_hash)
@@ -0,0 +1,649 @@
+#!/usr/bin/python
+"""Resumable crawl of the SENAMHI hydrometeorology network
+This Python module downloads several stations and months of the hydrometeorology
+SENAMHI webpage (see se_hydrometeo) and records the state of each (station, month)
+in a SQLite journal. If the crawl crashes, it can be resumed and just the
+unfinished (station, month) are downloaded again.
+
+The downloaded data is saved as one .CSV file by station-month:
+
+    out_dir/<station_code>/<station_code>_<YYYYMM>.csv          (or .pickle, .arrow)
+    out_dir/<station_code>/<station_code>_<YYYYMM>.daily.csv    (rollups=True)
+    out_dir/<station_code>/<station_code>_<YYYYMM>.monthly.csv  (rollups=True)
+
+FUNCTIONS
+------------------------------------------------------------
+    AUXILIARY:
+        - CrawlJournal: SQLite journal of the crawl (pending, done or failed station-months).
+        - month_path: Output filename of a station-month.
+        - select_stations: Station codes of the registry that match metadata filters.
+        - read_station_file: Station codes of a text file.
+        - read_month: Read a saved station-month.
+        - month_coverage: Fraction of non-missing values of a station-month.
+        - find_gaps: Station-months with a low coverage, failed or without file.
+    MAIN:
+        crawl: Download several stations considering a date interval.
+        repair: Download again just the station-months with a low coverage, failed or without file.
+        main: Command line interface of crawl.
+
+MODE OF USE
+------------------------------------------------------------
+    >>> from phd_scraper import crawl
+    >>> crawl.crawl(stations=['100090', '112267'],
+                    init_date='2019-01-01',
+                    last_date='2019-12-31',
+                    out_dir='senamhi')
+    >>> # After a crash, download just the unfinished station-months
+    >>> crawl.crawl(stations=['100090', '112267'],
+                    init_date='2019-01-01',
+                    last_date='2019-12-31',
+                    out_dir='senamhi',
+                    resume=True)
+    >>> # Download again the months with less than 50% of data
+    >>> crawl.repair(out_dir='senamhi', threshold=0.5)
+
+    $ python3 -m phd_scraper.crawl --filter estado=AUTOMATICA --init_date 2019-01-01 --last_date 2019-12-31
+      --out_dir senamhi --workers 8 --cache_dir senamhi_cache --sink pickle
+    $ python3 -m phd_scraper.crawl --stations stations.txt --init_date 2019-01-01 --last_date 2019-12-31
+      --out_dir senamhi --resume
+    $ python3 -m phd_scraper.crawl --stations stations.txt --init_date 2000-01-01 --last_date 2024-12-31
+      --out_dir senamhi --cache_dir senamhi_cache --dry_run
+"""
+
+from __future__ import print_function
+
+import os
+import re
+import sys
+import sqlite3
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+from calendar import monthrange
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from . import export
+from . import rollup
+from . import planner
+from . import se_hydrometeo
+from .cache import SharedCache
+
+try:
+    from urllib.request import pathname2url
+except ImportError:
+    from urllib import pathname2url
+
+_logger = logging.getLogger(__name__)
+
+CACHE_FILENAME = 'phd_scraper_cache.sqlite'
+
+_MONTH_FILE = re.compile(r'^(.+)_(\d{6})\.(csv|pickle|arrow)$')
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class CrawlJournal(object):
+    '''SQLite journal of the crawl.
+    Each (station, month) is saved with its status (pending, done or failed), the output
+    filename, the content hash and the coverage (see month_coverage) of the output.
+    Args:
+    -path: Filename of the SQLite database.
+    -read_only: Logical; Whether it is True an existing journal is opened read-only (see
+     planner.plan): nothing is created or migrated, and the write methods fail.
+    '''
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        if read_only:
+            self.conn = sqlite3.connect('file:%s?mode=ro' % pathname2url(os.path.abspath(path)), uri=True)
+            # Journals created before the coverage column are read with a NULL coverage
+            columns = [row[1] for row in self.conn.execute('PRAGMA table_info(jobs)')]
+            self._coverage = 'coverage' if 'coverage' in columns else 'NULL AS coverage'
+            return
+        self._coverage = 'coverage'
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'station TEXT NOT NULL, '
+            'month TEXT NOT NULL, '
+            'status TEXT NOT NULL, '
+            'output TEXT, '
+            'hash TEXT, '
+            'error TEXT, '
+            'updated TEXT, '
+            'coverage REAL, '
+            'PRIMARY KEY (station, month))')
+        # Journals created before the coverage column
+        if 'coverage' not in [row[1] for row in self.conn.execute('PRAGMA table_info(jobs)')]:
+            self.conn.execute('ALTER TABLE jobs ADD COLUMN coverage REAL')
+        self.conn.commit()
+
+    def add(self, jobs, reset=False):
+        '''Register (station, month) jobs as pending.
+        Args:
+        -jobs: List of tuples (station_code, %Y%m).
+        -reset: Logical; Whether it is True the jobs already registered are set as pending again.
+        '''
+        now = datetime.now().isoformat()
+        if reset:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO jobs (station, month, status, updated) VALUES (?, ?, ?, ?)',
+                [(station, month, PENDING, now) for station, month in jobs])
+        else:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO jobs (station, month, status, updated) VALUES (?, ?, ?, ?)',
+                [(station, month, PENDING, now) for station, month in jobs])
+        self.conn.commit()
+
+    def mark_done(self, station, month, output, output_hash, coverage=None):
+        '''Record a finished (station, month).'''
+        self.conn.execute(
+            'UPDATE jobs SET status = ?, output = ?, hash = ?, coverage = ?, error = NULL, updated = ? '
+            'WHERE station = ? AND month = ?',
+            (DONE, output, output_hash, coverage, datetime.now().isoformat(), station, month))
+        self.conn.commit()
+
+    def set_coverage(self, station, month, output, coverage):
+        '''Record the coverage of the output of (station, month). Unknown jobs are registered as done.'''
+        now = datetime.now().isoformat()
+        self.conn.execute('UPDATE jobs SET output = ?, coverage = ?, updated = ? WHERE station = ? AND month = ?',
+                          (output, coverage, now, station, month))
+        self.conn.execute('INSERT OR IGNORE INTO jobs (station, month, status, output, coverage, updated) '
+                          'VALUES (?, ?, ?, ?, ?, ?)', (station, month, DONE, output, coverage, now))
+        self.conn.commit()
+
+    def mark_failed(self, station, month, error):
+        '''Record a failed (station, month).'''
+        self.conn.execute(
+            'UPDATE jobs SET status = ?, error = ?, updated = ? WHERE station = ? AND month = ?',
+            (FAILED, error, datetime.now().isoformat(), station, month))
+        self.conn.commit()
+
+    def unfinished(self, jobs=None):
+        '''Return the (station, month) jobs which are pending or failed.
+        Args:
+        -jobs: List of tuples (station_code, %Y%m). Whether it is given, just these jobs are considered.
+        '''
+        rows = self.conn.execute(
+            'SELECT station, month FROM jobs WHERE status != ? ORDER BY station, month', (DONE,)).fetchall()
+        if jobs is not None:
+            jobs = set(jobs)
+            rows = [row for row in rows if row in jobs]
+        return rows
+
+    def get(self, station, month):
+        '''Return a dictionary with the record of (station, month) or None.'''
+        cursor = self.conn.execute(
+            'SELECT station, month, status, output, hash, error, updated, %s FROM jobs '
+            'WHERE station = ? AND month = ?' % self._coverage, (station, month))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([col[0] for col in cursor.description], row))
+
+    def records(self):
+        '''Return a dictionary {(station, month): record (see get)} of all the jobs.'''
+        cursor = self.conn.execute(
+            'SELECT station, month, status, output, hash, error, updated, %s FROM jobs' % self._coverage)
+        columns = [col[0] for col in cursor.description]
+        return dict(((row[0], row[1]), dict(zip(columns, row))) for row in cursor)
+
+    def summary(self):
+        '''Return the number of jobs by status.'''
+        rows = self.conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return dict(rows)
+
+    def close(self):
+        self.conn.close()
+
+
+def month_path(out_dir, station_code, month, sink='csv'):
+    '''Output filename of a station-month.
+    Args:
+    -out_dir: Output folder of the crawl.
+    -station_code: station new code.
+    -month: %Y%m Date format (it is SENAMHI format)
+    -sink: Output format (see SINKS).
+    '''
+    return os.path.join(out_dir, str(station_code), '%s_%s.%s' % (station_code, month, sink))
+
+
+def _write_csv(station_data, filename, station_class, station_code):
+    station_data.to_csv(filename, index=False)
+
+
+def _write_pickle(station_data, filename, station_class, station_code):
+    station_data.to_pickle(filename)
+
+
+def _write_arrow(station_data, filename, station_class, station_code):
+    export.write_ipc(station_data, station_class, filename, station_code=station_code)
+
+
+SINKS = {
+    'csv': _write_csv,
+    'pickle': _write_pickle,
+    'arrow': _write_arrow,
+}
+
+
+def select_stations(metadata_db=se_hydrometeo.__datadir__, **filters):
+    '''Station codes of the registry that match all the filters.
+    Args:
+    -metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
+    -filters: Metadata key=value (e.g. estado='AUTOMATICA', ico='M').
+    '''
+    return [dic['cod'] for dic in se_hydrometeo.read_metadata(metadata_db)
+            if all(str(dic.get(key)) == str(value) for key, value in filters.items())]
+
+
+def read_station_file(filename):
+    '''Station codes of a text file (one code by line, lines starting with # are ignored).'''
+    with open(filename) as station_file:
+        lines = [line.strip() for line in station_file]
+    return [line.split(',')[0] for line in lines if line and not line.startswith('#')]
+
+
+def crawl(stations, init_date, last_date, out_dir, journal=None, resume=False, completedata=True,
+          quiet=True, metadata_db=se_hydrometeo.__datadir__, rollups=False, workers=1, cache_dir=None,
+          sink='csv', progress=False):
+    '''Download several stations considering a date interval.
+       Args:
+        - stations: List of station new codes.
+        - init_date: Init date to start to download. Use the format %Y-%m-%d (e.g. 2019-01-10).
+        - last_date: Last date to start to download. Use the format %Y-%m-%d (e.g. 2019-01-10).
+        - out_dir: Output folder. Each station-month is saved as out_dir/<station>/<station>_<YYYYMM>.<sink>
+        - journal: String; Filename of the journal. By default out_dir/crawl_journal.sqlite
+        - resume: Logical; Whether it is True just the pending or failed station-months are downloaded.
+        - completedata: Logical; Whether it is True the missing dates will be completed with np.NaN.
+        - quiet: Logical. Suppress info message.
+        - metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
+        - rollups: Logical; Whether it is True the daily and monthly aggregates of each station-month are
+          saved next to its output file as .CSV (see phd_scraper.rollup).
+        - workers: Number of station-months downloaded concurrently.
+        - cache_dir: String; Folder of the SharedCache (cache_dir/phd_scraper_cache.sqlite, see phd_scraper.cache).
+          It can be shared by several crawls running at the same time. By default no cache is used.
+          The station-months are dispatched in the order of planner.plan (cached pages first).
+        - sink: Output format, one of SINKS ('csv', 'pickle' or 'arrow').
+        - progress: Logical; Print the progress of the crawl.
+       Returns:
+        - Dictionary with the number of jobs by status.
+    '''
+    if sink not in SINKS:
+        raise Exception("crawl: sink must be one of %s" % sorted(SINKS))
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    if journal is None:
+        journal = os.path.join(out_dir, 'crawl_journal.sqlite')
+    cache = SharedCache(os.path.join(cache_dir, CACHE_FILENAME)) if cache_dir is not None else None
+
+    months = [date.strftime('%Y%m') for date in pd.date_range(start=init_date, end=last_date, freq='MS')]
+    jobs = [(str(station), month) for station in stations for month in months]
+
+    crawl_journal = CrawlJournal(journal)
+    try:
+        crawl_journal.add(jobs, reset=not resume)
+        # Dispatch in the order of the plan: cached pages first, then the requests (see phd_scraper.planner)
+        pending = planner.order_jobs(crawl_journal.unfinished(jobs),
+                                     planner.plan(stations, init_date, last_date, cache=cache, metadata_db=metadata_db))
+        _logger.info("%s of %s station-months to download", len(pending), len(jobs))
+        _dispatch(crawl_journal, pending, out_dir, workers=workers, progress=progress, completedata=completedata,
+                  quiet=quiet, metadata_db=metadata_db, rollups=rollups, cache=cache, sink=sink)
+        return crawl_journal.summary()
+    finally:
+        crawl_journal.close()
+
+
+def _dispatch(crawl_journal, jobs, out_dir, workers=1, progress=False, **kwargs):
+    '''Run _crawl_month for each (station, month) job on a thread pool and record the results.
+    Workers just download and write; the journal is updated from this thread.
+    Return the list of finished jobs.
+    '''
+    finished = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = dict((executor.submit(_crawl_month, station_code, month, out_dir, **kwargs), (station_code, month))
+                       for station_code, month in jobs)
+        for n, future in enumerate(as_completed(futures), 1):
+            station_code, month = futures[future]
+            try:
+                output, output_hash, coverage = future.result()
+            except Exception as error:
+                _logger.warning("%s %s failed: %r", station_code, month, error)
+                crawl_journal.mark_failed(station_code, month, repr(error))
+                status = FAILED
+            else:
+                crawl_journal.mark_done(station_code, month, output, output_hash, coverage)
+                finished.append((station_code, month))
+                status = DONE
+            if progress:
+                print('[%s/%s] %s %s %s' % (n, len(jobs), station_code, month, status))
+    return finished
+
+
+def _crawl_month(station_code, month, out_dir, completedata=True, quiet=True,
+                 metadata_db=se_hydrometeo.__datadir__, rollups=False, cache=None, sink='csv'):
+    '''Download and save one station-month. Return the tuple (output filename, content hash, coverage).'''
+    if not quiet:
+        print('Processing: %s %s' % (station_code, month))
+    date = '%s-%s-01' % (month[:4], month[4:])
+    station_data = se_hydrometeo.download_one_month(station_code=station_code, date=date, quiet=quiet,
+                                                    completedata=completedata, metadata_db=metadata_db,
+                                                    cache=cache, strict=True)
+    output = month_path(out_dir, station_code, month, sink)
+    if not os.path.isdir(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    station_class = se_hydrometeo.gaugestation_clasification(station_code, return_type=False, metadata_db=metadata_db)
+    SINKS[sink](station_data, output + '.tmp', station_class, station_code)
+    with open(output + '.tmp', 'rb') as output_file:
+        output_hash = hashlib.sha1(output_file.read()).hexdigest()
+    os.replace(output + '.tmp', output)
+    if rollups:
+        rollup.save_rollups(station_data, month_path(out_dir, station_code, month, 'csv'))
+    return output, output_hash, month_coverage(station_data, month)
+
+
+def read_month(filename):
+    '''Read a station-month saved by crawl (.csv, .pickle or .arrow).'''
+    sink = os.path.splitext(filename)[1][1:]
+    if sink == 'csv':
+        return pd.read_csv(filename)
+    elif sink == 'pickle':
+        return pd.read_pickle(filename)
+    elif sink == 'arrow':
+        pa = export._import_pyarrow()
+        return pa.ipc.open_file(pa.memory_map(filename)).read_all().to_pandas()
+    raise Exception("read_month: unknown format %s" % filename)
+
+
+def month_coverage(station_data, month):
+    '''Fraction of non-missing values of a station-month.
+    The expected values are the days (hours) of the month times the variables of the station.
+    Args:
+    -station_data: pd.DataFrame of one station-month.
+    -month: %Y%m Date format (it is SENAMHI format)
+    '''
+    variables = [col for col in station_data.columns if col not in ('DATE', 'HOUR')]
+    expected_rows = monthrange(int(month[:4]), int(month[4:]))[1] * (24 if 'HOUR' in station_data.columns else 1)
+    if not variables:
+        return 0.0
+    values = station_data[variables].apply(pd.to_numeric, errors='coerce').values.astype(float)
+    return np.isfinite(values).sum() / float(expected_rows * len(variables))
+
+
+def _month_files(out_dir, station_code):
+    '''Saved station-months of a station as a dictionary {%Y%m: filename}.'''
+    station_dir = os.path.join(out_dir, str(station_code))
+    if not os.path.isdir(station_dir):
+        return {}
+    files = {}
+    for name in sorted(os.listdir(station_dir)):
+        match = _MONTH_FILE.match(name)
+        if match is not None and match.group(1) == str(station_code):
+            files[match.group(2)] = os.path.join(station_dir, name)
+    return files
+
+
+def find_gaps(out_dir, threshold=0.5, stations=None, journal=None, sink=None):
+    '''Station-months of a crawl whose coverage is lower than threshold.
+    The gaps are the saved months with a low coverage, and the months of the journal that failed
+    (or are pending) or whose file is missing (coverage 0). The coverage is saved in the journal,
+    so just the files that are not in the journal (or were saved by an older version) are read.
+    Args:
+    -out_dir: Output folder of crawl.
+    -threshold: Minimum coverage (0-1) of a complete month.
+    -stations: List of station new codes. By default all the stations of out_dir and the journal.
+    -journal: String; Filename of the journal. By default out_dir/crawl_journal.sqlite (if it exists).
+    -sink: Output format of the months without file. By default the format of the other months of
+     the station ('csv' if there is none).
+    Returns:
+    -List of tuples (station_code, %Y%m, coverage, filename).
+    '''
+    if journal is None and os.path.exists(os.path.join(out_dir, 'crawl_journal.sqlite')):
+        journal = os.path.join(out_dir, 'crawl_journal.sqlite')
+    crawl_journal = CrawlJournal(journal) if journal is not None else None
+    try:
+        records = crawl_journal.records() if crawl_journal is not None else {}
+        months_by_station = {}
+        for station_code, month in records:
+            months_by_station.setdefault(station_code, set()).add(month)
+        if stations is None:
+            stations = set(months_by_station)
+            if os.path.isdir(out_dir):
+                stations |= set(name for name in os.listdir(out_dir) if os.path.isdir(os.path.join(out_dir, name)))
+            stations = sorted(stations)
+
+        gaps = []
+        for station_code in [str(station) for station in stations]:
+            files = _month_files(out_dir, station_code)
+            station_sink = sink
+            if station_sink is None:
+                sinks = [os.path.splitext(filename)[1][1:] for filename in files.values()]
+                station_sink = max(sorted(set(sinks)), key=sinks.count) if sinks else 'csv'
+            for month in sorted(set(files) | months_by_station.get(station_code, set())):
+                record = records.get((station_code, month))
+                filename = files.get(month)
+                if filename is None:
+                    filename, coverage = month_path(out_dir, station_code, month, station_sink), 0.0
+                elif record is not None and record['coverage'] is not None and record['output'] == filename:
+                    coverage = record['coverage']
+                else:
+                    coverage = month_coverage(read_month(filename), month)
+                    if crawl_journal is not None:
+                        crawl_journal.set_coverage(station_code, month, filename, coverage)
+                if coverage < threshold or (record is not None and record['status'] != DONE):
+                    gaps.append((station_code, month, coverage, filename))
+        return gaps
+    finally:
+        if crawl_journal is not None:
+            crawl_journal.close()
+
+
+def repair(out_dir, threshold=0.5, stations=None, journal=None, workers=1, completedata=True, quiet=True,
+           metadata_db=se_hydrometeo.__datadir__, cache=None, dry_run=False, progress=False, sink=None):
+    '''Download again just the station-months of a crawl with a coverage lower than threshold.
+    Empty months (e.g. the np.NaN months saved when a download failed), failed months and months
+    whose file is missing are found with find_gaps, so the cost depends on the number of gaps and
+    not on the length of the series. The new files are saved with the same format, and the journal is updated.
+       Args:
+        - out_dir: Output folder of crawl.
+        - threshold: Minimum coverage (0-1) of a complete month.
+        - stations: List of station new codes. By default all the stations of out_dir and the journal.
+        - journal: String; Filename of the journal. By default out_dir/crawl_journal.sqlite
+        - workers: Number of station-months downloaded concurrently.
+        - completedata: Logical; Whether it is True the missing dates will be completed with np.NaN.
+        - quiet: Logical. Suppress info message.
+        - metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
+        - cache: SharedCache object. By default it is not used, so the pages are downloaded again.
+        - dry_run: Logical; Whether it is True the gaps are returned but not downloaded.
+        - progress: Logical; Print the progress of the repair.
+        - sink: Output format of the months without file (see find_gaps).
+       Returns:
+        - Dictionary {'gaps': find_gaps(...), 'repaired': list of (station_code, %Y%m) downloaded again}.
+    '''
+    if journal is None:
+        journal = os.path.join(out_dir, 'crawl_journal.sqlite')
+    gaps = find_gaps(out_dir, threshold=threshold, stations=stations,
+                     journal=journal if os.path.exists(journal) else None, sink=sink)
+    if dry_run or not gaps:
+        return {'gaps': gaps, 'repaired': []}
+
+    crawl_journal = CrawlJournal(journal)
+    try:
+        repaired = []
+        for output_sink in SINKS:
+            jobs = [(station_code, month) for station_code, month, _, filename in gaps
+                    if filename.endswith('.' + output_sink)]
+            if not jobs:
+                continue
+            crawl_journal.add(jobs, reset=True)
+            rollups = dict((job, os.path.exists(rollup.rollup_path(month_path(out_dir, job[0], job[1]), 'D')))
+                           for job in jobs)
+            for with_rollups in (False, True):
+                group = [job for job in jobs if rollups[job] == with_rollups]
+                repaired += _dispatch(crawl_journal, group, out_dir, workers=workers, progress=progress,
+                                      completedata=completedata, quiet=quiet, metadata_db=metadata_db,
+                                      rollups=with_rollups, cache=cache, sink=output_sink)
+        return {'gaps': gaps, 'repaired': repaired}
+    finally:
+        crawl_journal.close()
+
+
+def parse_args(args):
+    """Parse command line parameters
+    Args:
+      args ([str]): command line parameters as list of strings
+
+    Returns:
+      :obj:`argparse.Namespace`: command line parameters namespace
+    """
+    parser = argparse.ArgumentParser(
+        description="Download several SENAMHI hydrometeorological stations")
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="PE_SENAMHI_HIDROMETEOROLOGY {ver}".format(ver=se_hydrometeo.__version__))
+    parser.add_argument(
+        "--stations",
+        dest="stations",
+        help="File with the new codes of the gauge stations (one by line)",
+        default=None,
+        type=str,
+        metavar="STR")
+    parser.add_argument(
+        "--filter",
+        dest="filters",
+        help="Select the gauge stations of the metadata with KEY=VALUE (e.g. estado=AUTOMATICA). It can be repeated",
+        default=[],
+        action="append",
+        metavar="KEY=VALUE")
+    parser.add_argument(
+        "--init_date",
+        dest="init_date",
+        help="target init date",
+        required=True,
+        type=str,
+        metavar="STR")
+    parser.add_argument(
+        "--last_date",
+        dest="last_date",
+        help="target last date",
+        required=True,
+        type=str,
+        metavar="STR")
+    parser.add_argument(
+        "--out_dir",
+        dest="out_dir",
+        help="Output folder",
+        required=True,
+        type=str,
+        metavar="STR")
+    parser.add_argument(
+        "--sink",
+        dest="sink",
+        help="Output format",
+        default="csv",
+        choices=sorted(SINKS))
+    parser.add_argument(
+        "--workers",
+        dest="workers",
+        help="Number of station-months downloaded concurrently",
+        default=4,
+        type=int,
+        metavar="INT")
+    parser.add_argument(
+        "--cache_dir",
+        dest="cache_dir",
+        help="Folder of the cache shared by several crawls",
+        default=None,
+        type=str,
+        metavar="STR")
+    parser.add_argument(
+        "--journal",
+        dest="journal",
+        help="Filename of the crawl journal (by default OUT_DIR/crawl_journal.sqlite)",
+        default=None,
+        type=str,
+        metavar="STR")
+    parser.add_argument(
+        "--resume",
+        dest="resume",
+        help="Download just the pending or failed station-months of the journal",
+        action="store_true")
+    parser.add_argument(
+        "--dry_run",
+        dest="dry_run",
+        help="Print the number of requests of the crawl (see phd_scraper.planner) without downloading",
+        action="store_true")
+    parser.add_argument(
+        "--rollups",
+        dest="rollups",
+        help="Save daily and monthly aggregates next to the data",
+        action="store_true")
+    parser.add_argument(
+        "--metadata_db",
+        dest="metadata_db",
+        help="Filedir: Dataset which contains metadata of gauge stations.",
+        default=se_hydrometeo.__datadir__,
+        type=str,
+        metavar="str")
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="loglevel",
+        help="set loglevel to INFO",
+        action="store_const",
+        const=logging.INFO)
+    parser.add_argument(
+        "-vv",
+        "--very-verbose",
+        dest="loglevel",
+        help="set loglevel to DEBUG",
+        action="store_const",
+        const=logging.DEBUG)
+    return parser.parse_args(args)
+
+
+def main(args):
+    """Main entry point allowing external calls
+
+    Args:
+      args ([str]): command line parameter list
+    """
+    args = parse_args(args)
+    se_hydrometeo.setup_logging(args.loglevel)
+    stations = select_stations(args.metadata_db, **dict(f.split('=', 1) for f in args.filters))
+    if args.stations is not None:
+        selected = set(stations)
+        stations = [station for station in read_station_file(args.stations) if station in selected]
+    if args.dry_run:
+        # A dry run does not write anything: a missing cache is not created
+        cache = None
+        if args.cache_dir is not None and os.path.exists(os.path.join(args.cache_dir, CACHE_FILENAME)):
+            cache = SharedCache(os.path.join(args.cache_dir, CACHE_FILENAME))
+        planner.dry_run(stations, args.init_date, args.last_date, workers=args.workers, cache=cache,
+                        out_dir=args.out_dir if os.path.isdir(args.out_dir) else None, journal=args.journal,
+                        metadata_db=args.metadata_db)
+        return
+    _logger.debug("Starting crawl of %s stations...", len(stations))
+    summary = crawl(stations, args.init_date, args.last_date, args.out_dir, journal=args.journal,
+                    resume=args.resume, metadata_db=args.metadata_db, rollups=args.rollups,
+                    workers=args.workers, cache_dir=args.cache_dir, sink=args.sink, progress=True)
+    print(summary)
+    _logger.info("Script ends here")
+
+
+def run():
+    """Entry point for console_scripts
+    """
+    main(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+"""Apache Arrow export of SENAMHI data
+This Python module converts the output of se_hydrometeo and se_historic into Apache
+Arrow record batches with a fixed schema by station class, so other tools (DuckDB,
+Polars, ...) can memory-map or stream the data without parsing .CSV files.
+
+    - DATE: date32
+    - HOUR: time32[s] (hourly station classes)
+    - Any other variable: float64 (missing values are null)
+
+The column sets follow se_hydrometeo.variables_by_typestation, plus the class
+'se_historic': ['DATE','PREC','TX','TN'].
+
+pyarrow is an optional dependency (pip install pyarrow).
+
+FUNCTIONS
+------------------------------------------------------------
+    AUXILIARY:
+        - columns_by_class: Columns of a station class.
+        - arrow_schema: Arrow schema of a station class.
+    MAIN:
+        to_arrow: Transform station data into a pyarrow.RecordBatch.
+        write_ipc: Save station data as an Arrow IPC file (or stream).
+
+MODE OF USE
+------------------------------------------------------------
+    >>> from phd_scraper import se_hydrometeo, export
+    >>> station_data = se_hydrometeo.download(station_code='100090', init_date='2019-01-01', last_date='2019-02-02')
+    >>> export.to_arrow(station_data, 'meteo_manual_deferred')
+    >>> se_hydrometeo.download(station_code='100090', init_date='2019-01-01', last_date='2019-02-02',
+                               to_arrow='100090.arrow')
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+
+try:
+    from . import se_hydrometeo
+except (ImportError, ValueError):
+    import se_hydrometeo
+
+HISTORIC_CLASS = 'se_historic'
+HISTORIC_COLUMNS = ['DATE', 'PREC', 'TX', 'TN']
+
+
+def columns_by_class(station_class):
+    '''Columns of a station class (se_hydrometeo.variables_by_typestation or 'se_historic').'''
+    if station_class == HISTORIC_CLASS:
+        return list(HISTORIC_COLUMNS)
+    if station_class not in se_hydrometeo.variables_by_typestation:
+        raise Exception("columns_by_class: station_class must be one of %s" %
+                        sorted(list(se_hydrometeo.variables_by_typestation) + [HISTORIC_CLASS]))
+    return list(se_hydrometeo.variables_by_typestation[station_class])
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("phd_scraper.export requires pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def arrow_schema(station_class):
+    '''Arrow schema of a station class.
+    Args:
+    -station_class: String; Station class (e.g. 'meteo_automatic' or 'se_historic').
+    '''
+    pa = _import_pyarrow()
+    fields = []
+    for col in columns_by_class(station_class):
+        if col == 'DATE':
+            fields.append(pa.field(col, pa.date32()))
+        elif col == 'HOUR':
+            fields.append(pa.field(col, pa.time32('s')))
+        else:
+            fields.append(pa.field(col, pa.float64()))
+    return pa.schema(fields, metadata={'station_class': station_class})
+
+
+def _hour_text(hours):
+    '''HOUR values as 'HH:MM:SS' (raw SENAMHI pages use 'HH:MM', see complete_monthly_data); missing values are None.'''
+    text = hours.astype(str).str.strip()
+    text = text.where(text.str.count(':') != 1, text + ':00')
+    return text.astype(object).where(hours.notnull(), None)
+
+
+def to_arrow(station_data, station_class, station_code=None):
+    '''Transform station data into a pyarrow.RecordBatch.
+    Args:
+    -station_data: pd.DataFrame (output of se_hydrometeo or se_historic).
+    -station_class: String; Station class (see gaugestation_clasification(..., return_type=False)).
+    -station_code: String; Saved in the schema metadata.
+    '''
+    pa = _import_pyarrow()
+    schema = arrow_schema(station_class)
+    if station_code is not None:
+        schema = schema.with_metadata({'station_class': station_class, 'station_code': str(station_code)})
+    arrays = []
+    for field in schema:
+        col = field.name
+        if col == 'DATE':
+            values = pd.to_datetime(station_data[col]).values.astype('datetime64[D]')
+            arrays.append(pa.array(values, type=pa.date32(), from_pandas=True))
+        elif col == 'HOUR':
+            seconds = pd.to_timedelta(_hour_text(station_data[col])).dt.total_seconds().values
+            mask = np.isnan(seconds)
+            arrays.append(pa.array(np.where(mask, 0, seconds).astype(np.int32), type=pa.time32('s'), mask=mask))
+        else:
+            values = pd.to_numeric(station_data[col], errors='coerce').values.astype(np.float64)
+            arrays.append(pa.array(values, type=pa.float64(), from_pandas=True))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_ipc(station_data, station_class, filename, station_code=None, stream=False):
+    '''Save station data as an Arrow IPC file (or stream).
+    Args:
+    -station_data: pd.DataFrame (output of se_hydrometeo or se_historic).
+    -station_class: String; Station class.
+    -filename: Output filename.
+    -station_code: String; Saved in the schema metadata.
+    -stream: Logical; Whether it is True the IPC stream format is written instead of the (memory-mappable) file format.
+    '''
+    pa = _import_pyarrow()
+    batch = to_arrow(station_data, station_class, station_code=station_code)
+    new_writer = pa.ipc.new_stream if stream else pa.ipc.new_file
+    with pa.OSFile(filename, 'wb') as sink:
+        with new_writer(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+    return filename
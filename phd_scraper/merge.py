@@ -0,0 +1,131 @@
+#!/usr/bin/python
+"""Merge of SENAMHI historic and real-time daily series
+The same gauge station is published by se_historic (old code, 'descarga/?cod=') and
+by se_hydrometeo (new code 'cod', with the old code 'cod_old' in the metadata).
+This Python module joins both sources on one daily index with the columns:
+
+  merged_series :['DATE','PREC','TX','TN','SOURCE_PREC','SOURCE_TX','SOURCE_TN']
+
+where SOURCE_* tells which source ('historic' or 'realtime') gave each value.
+The overlaps are resolved by a source priority (by default the real-time data).
+
+    - se_historic: PREC, TX, TN
+    - se_hydrometeo (meteo_manual_*): PREC_D -> PREC, TX, TN
+
+FUNCTIONS
+------------------------------------------------------------
+    AUXILIARY:
+        - code_index: Index cod <-> cod_old of the network.
+        - daily_frame: se_historic or se_hydrometeo station data as a daily frame with PREC, TX and TN.
+    MAIN:
+        merge_series: Merge the historic and real-time series of one station.
+        merge_network: Merge the historic and real-time series of several stations.
+
+MODE OF USE
+------------------------------------------------------------
+    >>> from phd_scraper import se_historic, se_hydrometeo, merge
+    >>> historic = se_historic.download(station_code='000396')
+    >>> realtime = se_hydrometeo.download(station_code='100090', init_date='2019-01-01', last_date='2019-12-31')
+    >>> merge.merge_series(historic, realtime)
+    >>> merge.merge_network(historic={'000396': historic}, realtime={'100090': realtime})
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+
+from . import se_hydrometeo
+
+VARIABLES = ['PREC', 'TX', 'TN']
+SOURCES = ('realtime', 'historic')
+COLUMN_MAP = {
+    'historic': {'PREC': 'PREC', 'TX': 'TX', 'TN': 'TN'},
+    'realtime': {'PREC_D': 'PREC', 'TX': 'TX', 'TN': 'TN'},
+}
+
+
+def code_index(metadata_db=se_hydrometeo.__datadir__):
+    '''Index cod <-> cod_old of the network.
+    Args:
+    -metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
+    Returns:
+    -Tuple of dictionaries ({cod: cod_old}, {cod_old: cod}). Stations without cod_old are not included.
+    '''
+    metadata = se_hydrometeo.read_metadata(metadata_db)
+    new_to_old = dict((dic['cod'], dic['cod_old']) for dic in metadata if dic.get('cod_old'))
+    old_to_new = dict((cod_old, cod) for cod, cod_old in new_to_old.items())
+    return new_to_old, old_to_new
+
+
+def daily_frame(station_data, source):
+    '''se_historic or se_hydrometeo station data as a daily frame with PREC, TX and TN.
+    Args:
+    -station_data: pd.DataFrame (output of se_historic or se_hydrometeo meteo_manual_* stations).
+    -source: 'historic' or 'realtime'.
+    Returns:
+    -pd.DataFrame indexed by DATE (datetime64) with the float columns PREC, TX and TN.
+    '''
+    column_map = COLUMN_MAP[source]
+    dates = pd.to_datetime(station_data['DATE']).values.astype('datetime64[D]')
+    daily = pd.DataFrame(dict((new_col, pd.to_numeric(station_data[col], errors='coerce').values.astype(float)
+                              if col in station_data.columns else np.full(len(dates), np.nan))
+                              for col, new_col in column_map.items()),
+                         index=pd.DatetimeIndex(dates, name='DATE'), columns=VARIABLES)
+    return daily[~daily.index.duplicated(keep='last')]
+
+
+def merge_series(historic, realtime, priority=SOURCES):
+    '''Merge the historic and real-time series of one station.
+    Args:
+    -historic: pd.DataFrame returned by se_historic.download (or None).
+    -realtime: pd.DataFrame returned by se_hydrometeo.download (or None).
+    -priority: Sources sorted by priority; The value of the first source with data is kept.
+     The sources that are not in priority are ignored.
+    Returns:
+    -pd.DataFrame with the columns DATE, PREC, TX, TN, SOURCE_PREC, SOURCE_TX and SOURCE_TN
+     (empty when no source of priority has data).
+    '''
+    if isinstance(priority, str) or not set(priority) <= set(SOURCES):
+        raise Exception("merge_series: priority must be a sequence of %s" % (SOURCES,))
+    frames = {}
+    if 'historic' in priority and historic is not None and len(historic) > 0:
+        frames['historic'] = daily_frame(historic, 'historic')
+    if 'realtime' in priority and realtime is not None and len(realtime) > 0:
+        frames['realtime'] = daily_frame(realtime, 'realtime')
+    if not frames:
+        return pd.DataFrame(columns=['DATE'] + VARIABLES + ['SOURCE_%s' % var for var in VARIABLES])
+
+    index = frames[list(frames)[0]].index
+    for frame in frames.values():
+        index = index.union(frame.index)
+    index = pd.date_range(start=index.min(), end=index.max(), freq='D', name='DATE')
+
+    merged = pd.DataFrame({'DATE': index})
+    ordered = [source for source in priority if source in frames]
+    for variable in VARIABLES:
+        # (sources x days) array; the first source with a finite value wins
+        values = np.vstack([frames[source][variable].reindex(index).values for source in ordered])
+        valid = np.isfinite(values)
+        first = np.argmax(valid, axis=0)
+        has_value = valid.any(axis=0)
+        merged[variable] = np.where(has_value, values[first, np.arange(len(index))], np.nan)
+        merged['SOURCE_%s' % variable] = np.where(has_value, np.array(ordered, dtype=object)[first], None)
+    return merged[['DATE'] + VARIABLES + ['SOURCE_%s' % var for var in VARIABLES]]
+
+
+def merge_network(historic, realtime, priority=SOURCES, metadata_db=se_hydrometeo.__datadir__):
+    '''Merge the historic and real-time series of several stations.
+    Args:
+    -historic: Dictionary {cod_old: pd.DataFrame returned by se_historic.download}.
+    -realtime: Dictionary {cod: pd.DataFrame returned by se_hydrometeo.download}.
+    -priority: Sources sorted by priority; The value of the first source with data is kept.
+    -metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
+    Returns:
+    -Dictionary {cod: merged pd.DataFrame (see merge_series)}. Historic stations without a new code
+     are keyed by their old code.
+    '''
+    new_to_old, old_to_new = code_index(metadata_db)
+    codes = set(realtime) | set(old_to_new.get(cod_old, cod_old) for cod_old in historic)
+    return dict((cod, merge_series(historic.get(new_to_old.get(cod, cod)), realtime.get(cod), priority=priority))
+                for cod in sorted(codes))
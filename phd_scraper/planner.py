@@ -0,0 +1,197 @@
+#!/usr/bin/python
+"""Request planner for SENAMHI downloads
+This Python module computes the minimal list of HTTP requests needed by a query
+(stations x date interval) considering what is already saved:
+
+    - Station-months finished in the crawl journal or saved in the crawl output folder.
+    - Raw pages and altitudes saved in a SharedCache (see phd_scraper.cache).
+
+Three kinds of requests are planned:
+
+    - 'altitude': map_red_graf.php (see se_hydrometeo.add_altitude).
+    - 'month': _dato_esta_tipo02.php (see se_hydrometeo.fetch_senamhi_realtime).
+    - 'historic': descarga/?cod= (see se_historic.download).
+
+The altitude of a station is planned just before its months (so they reuse the
+cached altitude), and the requests of different hosts are interleaved. crawl dispatches
+its station-months in the order of the plan (see order_jobs): the months whose page is
+cached (planned out) go first, as they do not make any request.
+
+FUNCTIONS
+------------------------------------------------------------
+    AUXILIARY:
+        - Request: One planned HTTP request.
+        - estimate: Cost of a plan (number of requests and time).
+        - order_jobs: Sort (station, month) jobs in the order of a plan.
+    MAIN:
+        plan: Minimal list of requests of a query.
+        dry_run: Print the cost of a query without downloading anything.
+
+MODE OF USE
+------------------------------------------------------------
+    >>> from phd_scraper import planner
+    >>> from phd_scraper.cache import SharedCache
+    >>> cache = SharedCache('~/.phd_scraper/cache.sqlite')
+    >>> requests = planner.plan(stations=['100090', '112267'], init_date='2000-01-01',
+                                last_date='2024-12-31', cache=cache, out_dir='senamhi')
+    >>> planner.dry_run(stations=['100090', '112267'], init_date='2000-01-01',
+                        last_date='2024-12-31', cache=cache, out_dir='senamhi', workers=8)
+"""
+
+from __future__ import print_function
+
+import os
+import logging
+from collections import namedtuple, OrderedDict
+
+import pandas as pd
+
+from . import crawl
+from . import se_historic
+from . import se_hydrometeo
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+_logger = logging.getLogger(__name__)
+
+Request = namedtuple('Request', ['kind', 'host', 'url', 'station', 'month'])
+
+
+def _done_months(station_code, months, out_dir, crawl_journal):
+    '''Months of a station finished in the journal or saved in out_dir.'''
+    done = set()
+    for month in months:
+        if crawl_journal is not None:
+            record = crawl_journal.get(str(station_code), month)
+            if record is not None and record['status'] == crawl.DONE:
+                done.add(month)
+                continue
+        if out_dir is not None and any(os.path.exists(crawl.month_path(out_dir, station_code, month, sink))
+                                       for sink in crawl.SINKS):
+            done.add(month)
+    return done
+
+
+def _interleave_hosts(requests):
+    '''Round-robin the requests of each host (the order inside a host is kept).'''
+    by_host = OrderedDict()
+    for request in requests:
+        by_host.setdefault(request.host, []).append(request)
+    queues = list(by_host.values())
+    interleaved = []
+    for position in range(max([len(queue) for queue in queues] or [0])):
+        interleaved += [queue[position] for queue in queues if position < len(queue)]
+    return interleaved
+
+
+def plan(stations, init_date, last_date, cache=None, out_dir=None, journal=None, historic=None,
+         metadata_db=se_hydrometeo.__datadir__):
+    '''Minimal list of requests of a query.
+    Args:
+    -stations: List of station new codes (se_hydrometeo).
+    -init_date, last_date: Date interval. Use the format %Y-%m-%d (e.g. 2019-01-10).
+    -cache: SharedCache object. Fresh raw pages and altitudes are not requested again.
+    -out_dir: Output folder of crawl. Saved station-months are not requested again.
+    -journal: String; Filename of the crawl journal. By default out_dir/crawl_journal.sqlite. It is
+     opened read-only, and it is ignored when it does not exist (plan does not write anything).
+    -historic: List of station codes of se_historic.
+    -metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
+    Returns:
+    -List of Request (kind, host, url, station, month). The cache is only read (the access time of
+     the entries is not updated). The url of the months uses the altitude of metadata_db, since
+     the live altitude is not known before its request (the cache key does not depend on it, see
+     se_hydrometeo.response_key).
+    '''
+    if journal is None and out_dir is not None:
+        journal = os.path.join(out_dir, 'crawl_journal.sqlite')
+    if journal is not None and os.path.exists(journal):
+        crawl_journal = crawl.CrawlJournal(journal, read_only=True)
+    else:
+        crawl_journal = None
+
+    months = [date.strftime('%Y%m') for date in pd.date_range(start=init_date, end=last_date, freq='MS')]
+    metadata = dict((dic['cod'], dic) for dic in se_hydrometeo.read_metadata(metadata_db))
+    requests = []
+    try:
+        for station_code in stations:
+            if str(station_code) not in metadata:
+                _logger.warning("plan: %s is not in the metadata", station_code)
+                continue
+            station = dict(metadata[str(station_code)])
+            done = _done_months(station_code, months, out_dir, crawl_journal)
+            pending = [month for month in months if month not in done]
+            if not pending:
+                continue
+
+            alt_url = se_hydrometeo.altitude_url(station["cod"], station["estado"], station["ico"],
+                                                 station["cate"], station.get("cod_old"))
+            alt_request = Request('altitude', urlparse(alt_url).netloc, alt_url, str(station_code), None)
+            if cache is not None and not cache.contains('altitude', alt_url, max_age=cache.altitude_max_age):
+                requests.append(alt_request)
+
+            for month in pending:
+                if cache is not None and cache.contains('response', se_hydrometeo.response_key(station, month),
+                                                        max_age=se_hydrometeo.response_max_age(cache, month)):
+                    continue
+                if cache is None:
+                    # Without cache the altitude is requested again for each month
+                    requests.append(alt_request._replace(month=month))
+                url = se_hydrometeo.realtime_url(dict(station, alt=station.get('alt', '')), month)
+                requests.append(Request('month', urlparse(url).netloc, url, str(station_code), month))
+    finally:
+        if crawl_journal is not None:
+            crawl_journal.close()
+
+    for station_code in historic or []:
+        url = se_historic.historic_url(station_code)
+        if cache is not None and cache.contains('historic', url, max_age=cache.response_max_age):
+            continue
+        requests.append(Request('historic', urlparse(url).netloc, url, str(station_code), None))
+    return _interleave_hosts(requests)
+
+
+def order_jobs(jobs, requests):
+    '''Sort (station, month) jobs in the order of a plan.
+    Args:
+    -jobs: List of tuples (station_code, %Y%m).
+    -requests: List of Request (see plan).
+    Returns:
+    -List of jobs. The jobs without a month request (their page is cached) go first.
+    '''
+    position = dict(((request.station, request.month), n) for n, request in enumerate(requests)
+                    if request.kind == 'month')
+    return sorted(jobs, key=lambda job: position.get((str(job[0]), job[1]), -1))
+
+
+def estimate(requests, workers=1, seconds_by_request=1.0):
+    '''Cost of a plan.
+    Args:
+    -requests: List of Request (see plan).
+    -workers: Number of concurrent requests.
+    -seconds_by_request: Mean time of one request.
+    Returns:
+    -Dictionary with the number of requests by kind and host, the total and the estimated seconds.
+    '''
+    by_kind = {}
+    by_host = {}
+    for request in requests:
+        by_kind[request.kind] = by_kind.get(request.kind, 0) + 1
+        by_host[request.host] = by_host.get(request.host, 0) + 1
+    return {'requests': len(requests),
+            'by_kind': by_kind,
+            'by_host': by_host,
+            'stations': len(set(request.station for request in requests)),
+            'seconds': len(requests) * seconds_by_request / float(max(workers, 1))}
+
+
+def dry_run(stations, init_date, last_date, workers=1, seconds_by_request=1.0, **kwargs):
+    '''Print the cost of a query without downloading anything (kwargs are passed to plan).'''
+    cost = estimate(plan(stations, init_date, last_date, **kwargs), workers=workers,
+                    seconds_by_request=seconds_by_request)
+    print('%s requests (%s) for %s stations; about %.0f seconds with %s workers' % (
+        cost['requests'], ', '.join('%s %s' % (n, kind) for kind, n in sorted(cost['by_kind'].items())),
+        cost['stations'], cost['seconds'], workers))
+    return cost
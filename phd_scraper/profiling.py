@@ -0,0 +1,273 @@
+#!/usr/bin/python
+"""Memory profiling of the scrape-to-frame path
+This Python module measures, with tracemalloc, the memory used by each stage of the
+SENAMHI pipelines:
+
+    - se_hydrometeo: 'fetch' (HTML text), 'tables' (BeautifulSoup tree and string cells),
+      'frame' (tables_to_frame) and 'format' (format_senamhi_realtime).
+    - se_historic: 'fetch' (HTML text) and 'parse' (parse_historic).
+
+For each stage the report has the peak bytes reached during the stage, the bytes
+still allocated at the end of the stage and the number of new allocations. The stages
+can be run offline over recorded fixtures (the downloaded HTML pages), and the reports
+can be checked against thresholds to catch memory regressions. A small fixture set and
+its thresholds are kept in tests/fixtures/profiling (see tests/test_profiling.py).
+
+The one-time costs of the process (the metadata load, imports, caches of the parsers) and the
+garbage of previous stages are not measured, so a report does not depend on the order in which
+the station-months are profiled.
+
+The peak of a stage needs tracemalloc.reset_peak (Python >= 3.9). With older versions
+the peak of a stage also includes the previous stages of the same station-month.
+
+FUNCTIONS
+------------------------------------------------------------
+    AUXILIARY:
+        - record_fixture: Save the HTML page of a station-month (or historic station) as a fixture.
+        - write_report: Save a report as JSON.
+        - read_thresholds: Read the thresholds of check_thresholds from a JSON file.
+    MAIN:
+        profile_month: Memory by stage of one se_hydrometeo station-month.
+        profile_historic: Memory by stage of one se_historic station.
+        profile_fixtures: Memory by stage of all the fixtures of a folder (offline).
+        check_thresholds: Entries of a report over the thresholds.
+
+MODE OF USE
+------------------------------------------------------------
+    >>> from phd_scraper import profiling
+    >>> profiling.record_fixture('fixtures', station_code='100090', date='2019-01-01')
+    >>> profiling.record_fixture('fixtures', station_code='000396', historic=True)
+    >>> report = profiling.profile_fixtures('fixtures')
+    >>> profiling.write_report(report, 'memory_report.json')
+    >>> profiling.check_thresholds(report, {'peak_bytes': 50 * 1024 ** 2, 'tables': 30 * 1024 ** 2})
+    >>> profiling.check_thresholds(report, profiling.read_thresholds('tests/fixtures/profiling/thresholds.json'))
+"""
+
+from __future__ import print_function
+
+import gc
+import os
+import json
+import tracemalloc
+from datetime import datetime
+
+from . import se_historic
+from . import se_hydrometeo
+
+# Peak bytes of one real station-month (or historic station); see check_thresholds
+THRESHOLDS = {'peak_bytes': 64 * 1024 ** 2}
+
+
+def _reset_peak():
+    '''tracemalloc.reset_peak, available since Python 3.9.'''
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+
+class _Stages(object):
+    '''Measure consecutive stages with tracemalloc.'''
+
+    def __init__(self):
+        self.stages = []
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+        # Garbage of previous runs (the BeautifulSoup trees have reference cycles) is not measured
+        gc.collect()
+        self._snapshot = self._take_snapshot()
+        _reset_peak()
+
+    @staticmethod
+    def _take_snapshot():
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def mark(self, stage, base_bytes):
+        '''Close the current stage.'''
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = self._take_snapshot()
+        diff = snapshot.compare_to(self._snapshot, 'lineno')
+        self.stages.append({'stage': stage,
+                            'peak_bytes': peak - base_bytes,
+                            'net_bytes': current - base_bytes,
+                            'allocations': sum(stat.count_diff for stat in diff if stat.count_diff > 0)})
+        self._snapshot = snapshot
+        gc.collect()
+        _reset_peak()
+
+    def stop(self):
+        if self._started:
+            tracemalloc.stop()
+
+
+def _run_stages(steps, warm_up=False):
+    '''Run the steps [(stage, function(previous result))] and measure each one.
+    Whether warm_up is True the steps are run once before tracing, so the one-time costs of the
+    process (imports, caches of the parsers) are not measured.
+    '''
+    if warm_up:
+        result = None
+        for stage, step in steps:
+            result = step(result)
+    stages = _Stages()
+    try:
+        base_bytes = tracemalloc.get_traced_memory()[0]
+        result = None
+        for stage, step in steps:
+            result = step(result)
+            stages.mark(stage, base_bytes)
+        return stages.stages
+    finally:
+        stages.stop()
+
+
+def _report(kind, station_code, month, stages):
+    return {'kind': kind,
+            'station': str(station_code),
+            'month': month,
+            'stages': stages,
+            'peak_bytes': max([stage['peak_bytes'] for stage in stages] or [0])}
+
+
+def profile_month(station_code, date, html=None, station=None, completedata=True,
+                  metadata_db=se_hydrometeo.__datadir__):
+    '''Memory by stage of one se_hydrometeo station-month.
+    Args:
+    -station_code: station new code.
+    -date: Date of the month in the format %Y-%m-%d (e.g. 2019-01-10).
+    -html: String; HTML page of the month. Whether it is given (offline) the 'fetch' stage just uses it,
+     and the stages are run once before they are measured (see _run_stages), so the report does not
+     depend on the order of the station-months.
+    -station: Metadata of the gauge station as a dictionary (with altitude). By default it is read from
+     metadata_db (and the altitude is downloaded when html is not given).
+    -completedata: Logical; Whether it is True the missing dates will be completed with np.NaN.
+    -metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
+    Returns:
+    -Dictionary {'kind', 'station', 'month', 'stages': [{'stage', 'peak_bytes', 'net_bytes', 'allocations'}],
+     'peak_bytes'}.
+    '''
+    year_month = datetime.strptime(date, "%Y-%m-%d").strftime('%Y%m')
+    if station is None:
+        station = dict([dic for dic in se_hydrometeo.read_metadata(metadata_db) if dic['cod'] == str(station_code)][0])
+        if html is None:
+            station['alt'] = se_hydrometeo.add_altitude(station["cod"], station["estado"], station["ico"],
+                                                        station["cate"], station.get("cod_old"))
+    fetch = (lambda _: html) if html is not None else \
+        (lambda _: se_hydrometeo.fetch_senamhi_realtime(station, year_month, quiet=True))
+    # The 'format' stage reads the metadata: its one-time load is not part of the station-month
+    se_hydrometeo.read_metadata(metadata_db)
+    stages = _run_stages([
+        ('fetch', fetch),
+        ('tables', se_hydrometeo.html_tables),
+        ('frame', lambda tables: se_hydrometeo.tables_to_frame(tables, station)),
+        ('format', lambda total_df: se_hydrometeo.format_senamhi_realtime(
+            total_df, station_code, completedata=completedata, metadata_db=metadata_db, year_month=year_month)),
+    ], warm_up=html is not None)
+    return _report('month', station_code, year_month, stages)
+
+
+def profile_historic(station_code, html=None):
+    '''Memory by stage of one se_historic station.
+    Args:
+    -station_code: Station code (se_historic).
+    -html: String; Historic page. Whether it is given (offline) the 'fetch' stage just uses it, and the
+     stages are run once before they are measured.
+    Returns:
+    -Dictionary with the same keys as profile_month.
+    '''
+    fetch = (lambda _: html) if html is not None else \
+        (lambda _: se_historic.fetch_historic(station_code))
+    stages = _run_stages([
+        ('fetch', fetch),
+        ('parse', se_historic.parse_historic),
+    ], warm_up=html is not None)
+    return _report('historic', station_code, None, stages)
+
+
+def record_fixture(fixture_dir, station_code, date=None, historic=False, metadata_db=se_hydrometeo.__datadir__):
+    '''Save the HTML page of a station-month (or historic station) as a fixture.
+    Two files are saved: <name>.html (page) and <name>.json (kind, station, date and station metadata).
+    Args:
+    -fixture_dir: Folder of the fixtures.
+    -station_code: Station code.
+    -date: Date of the month in the format %Y-%m-%d (se_hydrometeo).
+    -historic: Logical; Whether it is True the se_historic page of the station is saved.
+    -metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
+    Returns:
+    -Filename of the .html fixture.
+    '''
+    if not os.path.isdir(fixture_dir):
+        os.makedirs(fixture_dir)
+    if historic:
+        name = 'historic_%s' % station_code
+        html = se_historic.fetch_historic(station_code)
+        info = {'kind': 'historic', 'station': str(station_code)}
+    else:
+        year_month = datetime.strptime(date, "%Y-%m-%d").strftime('%Y%m')
+        name = 'month_%s_%s' % (station_code, year_month)
+        station = dict([dic for dic in se_hydrometeo.read_metadata(metadata_db) if dic['cod'] == str(station_code)][0])
+        station['alt'] = se_hydrometeo.add_altitude(station["cod"], station["estado"], station["ico"],
+                                                    station["cate"], station.get("cod_old"))
+        html = se_hydrometeo.fetch_senamhi_realtime(station, year_month, quiet=True)
+        info = {'kind': 'month', 'station': str(station_code), 'date': date, 'metadata': station}
+    with open(os.path.join(fixture_dir, name + '.html'), 'w') as html_file:
+        html_file.write(html)
+    with open(os.path.join(fixture_dir, name + '.json'), 'w') as info_file:
+        json.dump(info, info_file, indent=2)
+    return os.path.join(fixture_dir, name + '.html')
+
+
+def profile_fixtures(fixture_dir, completedata=True, metadata_db=se_hydrometeo.__datadir__):
+    '''Memory by stage of all the fixtures of a folder (offline, see record_fixture).
+    Returns:
+    -List of reports (see profile_month and profile_historic).
+    '''
+    reports = []
+    for name in sorted(os.listdir(fixture_dir)):
+        html_name = os.path.join(fixture_dir, name[:-len('.json')] + '.html')
+        # Other .json files (e.g. thresholds) are not fixtures
+        if not name.endswith('.json') or not os.path.exists(html_name):
+            continue
+        with open(os.path.join(fixture_dir, name)) as info_file:
+            info = json.load(info_file)
+        with open(html_name) as html_file:
+            html = html_file.read()
+        if info['kind'] == 'historic':
+            reports.append(profile_historic(info['station'], html=html))
+        else:
+            reports.append(profile_month(info['station'], info['date'], html=html, station=info['metadata'],
+                                         completedata=completedata, metadata_db=metadata_db))
+    return reports
+
+
+def write_report(reports, filename):
+    '''Save a report (list of profile_* results) as JSON.'''
+    with open(filename, 'w') as report_file:
+        json.dump(reports, report_file, indent=2)
+    return filename
+
+
+def read_thresholds(filename):
+    '''Read the thresholds of check_thresholds from a JSON file.'''
+    with open(filename) as thresholds_file:
+        return json.load(thresholds_file)
+
+
+def check_thresholds(reports, thresholds=THRESHOLDS):
+    '''Entries of a report over the thresholds.
+    Args:
+    -reports: List of profile_* results.
+    -thresholds: Dictionary {stage name or 'peak_bytes': maximum peak bytes}. The optional key 'stations'
+     ({station code: {stage name or 'peak_bytes': maximum peak bytes}}) overrides them for some stations.
+    Returns:
+    -List of tuples (kind, station, month, stage, peak_bytes, threshold). It is empty when all pass.
+    '''
+    violations = []
+    for report in reports:
+        peaks = dict((stage['stage'], stage['peak_bytes']) for stage in report['stages'])
+        peaks['peak_bytes'] = report['peak_bytes']
+        limits = dict((stage, threshold) for stage, threshold in thresholds.items() if stage != 'stations')
+        limits.update(thresholds.get('stations', {}).get(report['station'], {}))
+        for stage, threshold in sorted(limits.items()):
+            if stage in peaks and peaks[stage] > threshold:
+                violations.append((report['kind'], report['station'], report['month'], stage, peaks[stage], threshold))
+    return violations
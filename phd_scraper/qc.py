@@ -0,0 +1,168 @@
+#!/usr/bin/python
+"""Quality control of SENAMHI hydrometeorology data
+This Python module screens the output of se_hydrometeo and se_historic (or a
+multi-station cube) with vectorized numpy checks. Each variable gets an array of
+flags (np.uint8) where every check sets one bit:
+
+    - RANGE (1): Value out of the physical range of the variable.
+    - SPIKE (2): Value that jumps away from both neighbours more than a threshold.
+    - FLAT (4): Value inside a run of identical values longer than a threshold.
+    - TX_LT_TN (8): Maximum temperature lower than minimum temperature.
+
+A flag equal to 0 means that the value passed all the checks (missing values are never flagged).
+The flags of a cube (time x stations) are computed in one pass per variable.
+
+FUNCTIONS
+------------------------------------------------------------
+    AUXILIARY:
+        - range_check: Values out of [lower, upper].
+        - spike_check: Isolated jumps bigger than a threshold.
+        - flat_line_check: Runs of identical values.
+        - station_cube: Stack one variable of several stations as a (time x stations) array.
+    MAIN:
+        quality_control: Flags of all the variables of a station (or a cube).
+
+MODE OF USE
+------------------------------------------------------------
+    >>> from phd_scraper import se_historic, qc
+    >>> station_data = se_historic.download(station_code='152204')
+    >>> flags = qc.quality_control(station_data)
+    >>> station_data[flags['TX'] == 0]
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+
+RANGE = 1
+SPIKE = 2
+FLAT = 4
+TX_LT_TN = 8
+
+LIMITS = {
+    'TX': (-30.0, 50.0),
+    'TN': (-40.0, 40.0),
+    'TEMP': (-40.0, 50.0),
+    'HUM': (0.0, 100.0),
+    'PREC': (0.0, 500.0),
+    'PREC_D': (0.0, 500.0),
+    'PREC_H': (0.0, 150.0),
+    'W_DIR': (0.0, 360.0),
+    'W_VEL': (0.0, 75.0),
+}
+
+SPIKE_THRESHOLDS = {
+    'TX': 15.0,
+    'TN': 15.0,
+    'TEMP': 10.0,
+    'HUM': 50.0,
+}
+
+FLAT_LENGTHS = {
+    'TX': 7,
+    'TN': 7,
+    'TEMP': 12,
+    'HUM': 12,
+    'W_VEL': 12,
+}
+
+
+def range_check(values, lower, upper):
+    '''Values out of [lower, upper] (missing values are not flagged).
+    Args:
+    -values: np.ndarray (time,) or (time, stations).
+    -lower, upper: Physical range of the variable.
+    '''
+    with np.errstate(invalid='ignore'):
+        return (values < lower) | (values > upper)
+
+
+def spike_check(values, threshold):
+    '''Values that jump away from both neighbours (in the same direction) more than threshold.
+    Args:
+    -values: np.ndarray (time,) or (time, stations).
+    -threshold: Maximum absolute jump.
+    '''
+    flags = np.zeros(values.shape, dtype=bool)
+    if values.shape[0] < 3:
+        return flags
+    with np.errstate(invalid='ignore'):
+        before = values[1:-1] - values[:-2]
+        after = values[1:-1] - values[2:]
+        flags[1:-1] = (np.abs(before) > threshold) & (np.abs(after) > threshold) & (before * after > 0)
+    return flags
+
+
+def flat_line_check(values, length):
+    '''Values inside a run of at least length identical values.
+    Args:
+    -values: np.ndarray (time,) or (time, stations).
+    -length: Minimum length of the run.
+    '''
+    columns = values.reshape(values.shape[0], -1).T
+    n_time = columns.shape[1]
+    if n_time == 0:
+        return np.zeros(values.shape, dtype=bool)
+    # A new run starts when the value changes, when it is missing, or at the first time step of a station
+    new_run = np.ones(columns.shape, dtype=bool)
+    with np.errstate(invalid='ignore'):
+        new_run[:, 1:] = ~(columns[:, 1:] == columns[:, :-1])
+    run_id = np.cumsum(new_run.ravel()) - 1
+    run_length = np.bincount(run_id)
+    flags = (run_length[run_id] >= length) & ~np.isnan(columns.ravel())
+    return flags.reshape(columns.shape).T.reshape(values.shape)
+
+
+def station_cube(frames, variable, date_column='DATE'):
+    '''Stack one variable of several stations as a (time x stations) array.
+    Args:
+    -frames: Dictionary {station_code: pd.DataFrame} (output of se_hydrometeo or se_historic).
+    -variable: Column name (e.g. 'TX').
+    -date_column: Column used to align the stations.
+    Returns:
+    -Tuple (pd.DatetimeIndex, list of station codes, np.ndarray (time x stations)).
+    '''
+    series = dict((station_code, pd.Series(pd.to_numeric(df[variable], errors='coerce').values,
+                                           index=pd.to_datetime(df[date_column])))
+                  for station_code, df in frames.items())
+    cube = pd.concat(series, axis=1).sort_index()
+    return cube.index, list(cube.columns), cube.values.astype(float)
+
+
+def quality_control(station_data, limits=LIMITS, spike_thresholds=SPIKE_THRESHOLDS, flat_lengths=FLAT_LENGTHS):
+    '''Flags of all the variables of a station (or a cube).
+    Args:
+    -station_data: pd.DataFrame (output of se_hydrometeo or se_historic) or dictionary
+     {variable: np.ndarray (time,) or (time, stations)}.
+    -limits: Dictionary {variable: (lower, upper)} for range_check.
+    -spike_thresholds: Dictionary {variable: threshold} for spike_check.
+    -flat_lengths: Dictionary {variable: length} for flat_line_check.
+    Returns:
+    -Dictionary {variable: np.ndarray of np.uint8 flags} with the same shape as the values.
+    '''
+    if isinstance(station_data, pd.DataFrame):
+        variables = [col for col in station_data.columns
+                     if col in limits or col in spike_thresholds or col in flat_lengths]
+        arrays = dict((variable, pd.to_numeric(station_data[variable], errors='coerce').values.astype(float))
+                      for variable in variables)
+    else:
+        arrays = dict((variable, np.asarray(values, dtype=float)) for variable, values in station_data.items())
+
+    flags = {}
+    for variable, values in arrays.items():
+        variable_flags = np.zeros(values.shape, dtype=np.uint8)
+        if variable in limits:
+            variable_flags[range_check(values, *limits[variable])] |= RANGE
+        if variable in spike_thresholds:
+            variable_flags[spike_check(values, spike_thresholds[variable])] |= SPIKE
+        if variable in flat_lengths:
+            variable_flags[flat_line_check(values, flat_lengths[variable])] |= FLAT
+        flags[variable] = variable_flags
+
+    if 'TX' in arrays and 'TN' in arrays:
+        with np.errstate(invalid='ignore'):
+            inverted = arrays['TX'] < arrays['TN']
+        flags['TX'][inverted] |= TX_LT_TN
+        flags['TN'][inverted] |= TX_LT_TN
+    return flags
@@ -0,0 +1,105 @@
+#!/usr/bin/python
+"""Daily and monthly aggregates of SENAMHI hydrometeorology data
+This Python module aggregates the output of se_hydrometeo (hourly or daily) to
+daily or monthly resolution. Precipitation is summed and the remaining variables
+are summarised with their mean, minimum and maximum. Each variable also has a
+coverage count (number of non-missing values used in the aggregate).
+
+    - PREC_H, PREC_D: ['<VAR>_SUM', '<VAR>_COUNT']
+    - TEMP, HUM, W_VEL, LEVEL, TX, TN, LEVEL_06, ...: ['<VAR>_MEAN', '<VAR>_MIN', '<VAR>_MAX', '<VAR>_COUNT']
+
+The aggregation is computed with numpy ufunc.reduceat over the blocks of consecutive
+rows of the same day (month), so it does not need pandas groupby.
+
+FUNCTIONS
+------------------------------------------------------------
+    AUXILIARY:
+        - rollup_path: Filename of the aggregate saved next to the raw data.
+    MAIN:
+        rollup: Aggregate station data to daily or monthly resolution.
+        save_rollups: Save the daily and monthly aggregates next to the raw data.
+
+MODE OF USE
+------------------------------------------------------------
+    >>> from phd_scraper import se_hydrometeo, rollup
+    >>> station_data = se_hydrometeo.download(station_code='112267', init_date='2019-01-01', last_date='2019-02-02')
+    >>> rollup.rollup(station_data, freq='D')
+    >>> rollup.rollup(station_data, freq='M')
+"""
+
+from __future__ import print_function
+
+import os
+
+import numpy as np
+import pandas as pd
+
+SUM_VARIABLES = ['PREC_H', 'PREC_D', 'PREC']
+STAT_VARIABLES = ['TEMP', 'HUM', 'W_VEL', 'LEVEL', 'TX', 'TN',
+                  'LEVEL_06', 'LEVEL_10', 'LEVEL_14', 'LEVEL_18']
+
+
+def _block_starts(keys):
+    '''First row of each block of consecutive equal keys.'''
+    if len(keys) == 0:
+        return np.array([], dtype=np.intp)
+    return np.concatenate([[0], np.flatnonzero(keys[1:] != keys[:-1]) + 1])
+
+
+def rollup(station_data, freq='D'):
+    '''Aggregate station data to daily or monthly resolution.
+    Args:
+    -station_data: pd.DataFrame returned by se_hydrometeo (sorted by DATE and HOUR).
+    -freq: 'D' (daily) or 'M' (monthly).
+    Returns:
+    -pd.DataFrame with a DATE column (first day of the day/month) and the aggregates.
+    '''
+    if freq not in ('D', 'M'):
+        raise Exception("rollup: freq must be 'D' or 'M'")
+    dates = pd.to_datetime(station_data['DATE']).values.astype('datetime64[%s]' % freq)
+    starts = _block_starts(dates)
+    rollup_df = pd.DataFrame({'DATE': pd.to_datetime(dates[starts])})
+    if len(starts) == 0:
+        return rollup_df
+
+    for variable in [col for col in station_data.columns if col in SUM_VARIABLES + STAT_VARIABLES]:
+        values = pd.to_numeric(station_data[variable], errors='coerce').values.astype(float)
+        valid = ~np.isnan(values)
+        count = np.add.reduceat(valid.astype(np.int64), starts)
+        total = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        empty = count == 0
+        if variable in SUM_VARIABLES:
+            rollup_df['%s_SUM' % variable] = np.where(empty, np.nan, total)
+        else:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                rollup_df['%s_MEAN' % variable] = np.where(empty, np.nan, total / count)
+            rollup_df['%s_MIN' % variable] = np.fmin.reduceat(values, starts)
+            rollup_df['%s_MAX' % variable] = np.fmax.reduceat(values, starts)
+        rollup_df['%s_COUNT' % variable] = count
+    return rollup_df
+
+
+def rollup_path(filename, freq):
+    '''Filename of the aggregate saved next to the raw data (e.g. test.csv -> test.daily.csv).
+    Args:
+    -filename: Filename of the raw data.
+    -freq: 'D' (daily) or 'M' (monthly).
+    '''
+    root, ext = os.path.splitext(filename)
+    return '%s.%s%s' % (root, {'D': 'daily', 'M': 'monthly'}[freq], ext or '.csv')
+
+
+def save_rollups(station_data, filename):
+    '''Save the daily and monthly aggregates next to the raw data.
+    Args:
+    -station_data: pd.DataFrame returned by se_hydrometeo.
+    -filename: Filename of the raw data (.CSV).
+    Returns:
+    -List with the filenames of the aggregates.
+    '''
+    filenames = []
+    for freq in ('D', 'M'):
+        rollup_filename = rollup_path(filename, freq)
+        rollup(station_data, freq=freq).to_csv(rollup_filename, index=False)
+        filenames.append(rollup_filename)
+    return filenames
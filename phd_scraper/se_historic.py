@@ -17,13 +17,16 @@ All functions created in this module are mentioned bellow.
 
     AUXILIARY:
         generate_date: Show metadata from the gauge station.
+        historic_url: URL of the SENAMHI historic page of a station.
+        fetch_historic: Download the SENAMHI historic page of a station.
+        parse_historic: Transform the SENAMHI historic page into pd.DataFrame.
     MAIN:
         download_senamhi_historic: Save SENAMHI HISTORIC DATA as a .CSV format.
 
 MODE OF USE
 ------------------------------------------------------------
     $ cd ~/phd_scraper/phd_scraper/
-    $ python3 se_historic.py --station_code 152204 --outfile cesar.csv
+    $ python3 se_historic.py --station_code 152204 --to_csv cesar.csv
     
     >>> from phd_scraper import se_historic
     >>> se_historic.download(code='152204')
@@ -71,6 +74,7 @@ import os
 import sys
 import re
 import json
+import hashlib
 import requests
 import argparse
 
@@ -78,6 +82,11 @@ from bs4 import BeautifulSoup
 import pandas as pd
 import numpy as np
 
+try:
+    from . import export
+except (ImportError, ValueError):
+    import export
+
 def generate_date(df, field_dates):
     """ Function for generate dates considering the last day of the year
         df: pd.DataFrame SENAMHI HISTORIC station
@@ -105,14 +114,11 @@ def generate_date(df, field_dates):
     df[field_dates] = dates
     return df    
 
-def download(station_code, to_csv = None):
-    """ Download station by station considering the station code
-        - station_code: Station code
-        - to_csv: String; Output filename.
+def parse_historic(html):
+    """ Transform the SENAMHI historic page (highcharts javascript) into pd.DataFrame
+        - html: String; Page downloaded from historic_url(station_code).
     """
-    response = \
-        requests.get('https://web2.senamhi.gob.pe/descarga/?cod={}'.format(station_code))
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = BeautifulSoup(html, 'html.parser')
     highcharts_header = [s.text for s in soup.find_all('script',
                          {'type': 'text/javascript'})]
     highcharts_header = highcharts_header[1].replace('\n', ''
@@ -164,19 +170,69 @@ def download(station_code, to_csv = None):
     
     data_station = generate_date(pd.DataFrame(dicc_station), 'DATE')  
     data_station.replace(to_replace=[None], value=np.nan, inplace=True)
+    return data_station
+
+def historic_url(station_code):
+    """ URL of the SENAMHI historic page of a station
+        - station_code: Station code
+    """
+    return 'https://web2.senamhi.gob.pe/descarga/?cod={}'.format(station_code)
+
+def fetch_historic(station_code):
+    """ Download the SENAMHI historic page of a station (error responses raise requests.HTTPError)
+        - station_code: Station code
+    """
+    response = requests.get(historic_url(station_code))
+    response.raise_for_status()
+    return response.text
+
+def download(station_code, to_csv = None, cache=None, to_arrow=None):
+    """ Download station by station considering the station code
+        - station_code: Station code
+        - to_csv: String; Output filename.
+        - to_arrow: String; Output filename of an Arrow IPC file (see phd_scraper.export).
+        - cache: SharedCache object (see phd_scraper.cache). The page is reused while it is younger than
+          cache.response_max_age, and the parse is reused while the page content does not change.
+          The page is saved just when it is parsed without errors.
+    """
+    url = historic_url(station_code)
+    if cache is None:
+        html = fetch_historic(station_code)
+    else:
+        cached = cache.get('historic', url, max_age=cache.response_max_age)
+        html_cached = cached is not None
+        html = cached[1] if html_cached else fetch_historic(station_code)
+        html_hash = hashlib.sha1(html.encode('utf-8')).hexdigest()
+        cached = cache.get('historic_parsed', str(station_code))
+        if cached is not None and cached[0] == html_hash:
+            if not html_cached:
+                cache.put('historic', url, html)
+            return _save(cached[1], station_code, to_csv, to_arrow)
+
+    data_station = parse_historic(html)
+    if cache is not None:
+        cache.put('historic_parsed', str(station_code), data_station, payload_hash=html_hash)
+        if not html_cached:
+            cache.put('historic', url, html)
+    return _save(data_station, station_code, to_csv, to_arrow)
+
+def _save(data_station, station_code, to_csv=None, to_arrow=None):
+    """ Save the station data as .CSV and/or Arrow IPC file and return it """
     if to_csv is not None:
         data_station.to_csv(to_csv, index=False)
+    if to_arrow is not None:
+        export.write_ipc(data_station, export.HISTORIC_CLASS, to_arrow, station_code=station_code)
     return data_station
 
 def main(arguments):
     parser = argparse.ArgumentParser(description=__doc__,
             formatter_class=argparse.RawDescriptionHelpFormatter)
-    parser.add_argument('-s', '--station_code', help='Output file',
-                            default=sys.stdout)
+    parser.add_argument('-s', '--station_code', help='Station code',
+                        required=True)
     parser.add_argument('-o', '--to_csv', help='Output file',
                         default=sys.stdout)
     args = parser.parse_args(arguments)    
-    download(station_code=args.station_code,to_csv=args.outfile)
+    download(station_code=args.station_code,to_csv=args.to_csv)
     
 if __name__ == '__main__':
     sys.exit(main(sys.argv[1:]))
\ No newline at end of file
@@ -22,12 +22,26 @@ All functions created in this module are mentioned bellow.
     AUXILIARY:
         - show_message: Show metadata from the gauge station.
         - gaugestation_clasification: Return the meteorological variables according to the gauge station class.
+        - altitude_url: URL of the SENAMHI page with the altitude of the gauge station.
         - add_altitude: Add altitude (to the metadata dictionary). This step is extremely necessary to make queries (.php?..).
+        - realtime_url: URL of the SENAMHI HTML page of one station-month.
+        - response_key: Cache key of the SENAMHI HTML page of one station-month.
+        - response_max_age: Seconds the cached SENAMHI HTML page of one station-month is reused.
+        - fetch_senamhi_realtime: Download the SENAMHI HTML page of one station-month.
+        - html_tables: Cells (strings) of the HTML tables of a SENAMHI page.
+        - tables_to_frame: Transform the cells of a SENAMHI page into pd.DataFrame.
+        - parse_senamhi_realtime: Transform a SENAMHI HTML page into pd.DataFrame.
+        - format_senamhi_realtime: Rename the columns, replace S/D and complete the missing dates of a parsed month.
         - data_senamhi_realtime: Transform SENAMHI HTML tables into pd.DataFrame.
         - complete_monthly_data: Complete missing dates with np.NaN.
         - download_data: Save SENAMHI HTML as a .CSV format.
+        - read_metadata: Read the metadata of the entire network (once by process).
+        - fetch_station_list: Download the station list (metadata without altitude) of the entire network.
+        - diff_metadata: Compare two versions of the metadata of the entire network.
+        - refresh_metadata: Rebuild se_hydrometeo.dictionary (station list + altitude) as a new versioned file.
     MAIN:
         download: Save SENAMHI HTML as a .CSV format considering a date interval.
+        download_days: Download specific days for several stations (one request by station-month).
 
 MODE OF USE
 ------------------------------------------------------------
@@ -92,13 +106,18 @@ and Hydrology Service (SENAMHI). The use of this data is of my (our) sole respon
 from __future__ import print_function
 
 import os
+import re
 import sys
 import json
+import hashlib
 import logging
 import requests
 import argparse
+import tempfile
+import threading
 import traceback
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 import pickle
 import numpy as np
@@ -107,6 +126,13 @@ import pandas as pd
 from bs4 import BeautifulSoup
 from calendar import monthrange
 
+try:
+    from . import rollup
+    from . import export
+except (ImportError, ValueError):
+    import rollup
+    import export
+
 __version__ = '0.1.3'
 __author__ = "csaybar & ryali"
 __copyright__ = "csaybar & ryali"
@@ -120,11 +146,35 @@ if len(os.path.dirname(__file__)) == 0:
 else:
     __datadir__ = '%s/se_hydrometeo.dictionary' % os.path.dirname(__file__)
 
-## Create a pickle
-#metadata_db = '~/senh_hist.json'    
-#metadata_db = json.loads(requests.get(metadata_db).text)
-#with open('senh_realtime.dictionary', 'wb') as config_dictionary_file:
-#pickle.dump(metadata_db, config_dictionary_file)
+__stations_url__ = 'https://www.senamhi.gob.pe/mapas/mapa-estaciones-2/'
+
+variables_by_typestation = {
+'meteo_manual_realtime':['DATE','TX','TN','HUM','PREC_D'],
+'meteo_manual_deferred':['DATE','TX','TN','HUM','PREC_D'],
+'meteo_automatic':['DATE','HOUR','TEMP','PREC_H','HUM','W_DIR','W_VEL'],
+'hidro_manual_realtime':['DATE','LEVEL_06','LEVEL_10','LEVEL_14','LEVEL_18'],
+'hidro_manual_deferred':['DATE','HOUR','LEVEL','PREC_H']
+}
+
+_metadata_cache = {}
+_metadata_lock = threading.Lock()
+
+def read_metadata(metadata_db=__datadir__):
+    '''Read the metadata of the entire network.
+    The pickle is read once by process (it is read again if the file is modified).
+    It can be called from several threads (see crawl and refresh_metadata).
+    Args:
+    -metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
+    '''
+    key = (os.path.abspath(metadata_db), os.path.getmtime(metadata_db))
+    with _metadata_lock:
+        metadata = _metadata_cache.get(key)
+        if metadata is None:
+            with open(metadata_db, 'rb') as config_dictionary_file: 
+                metadata = pickle.load(config_dictionary_file)
+            _metadata_cache.clear()
+            _metadata_cache[key] = metadata
+    return metadata
 
 def show_message(station_code, metadata_db=__datadir__):
     '''Show metadata from the gauge station.
@@ -134,8 +184,7 @@ def show_message(station_code, metadata_db=__datadir__):
     -metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
     '''
 
-    with open(metadata_db, 'rb') as config_dictionary_file: 
-        metadata_db = pickle.load(config_dictionary_file)     
+    metadata_db = read_metadata(metadata_db)
     #Search metadata for the station_code
     metadata_search = [dic for dic in metadata_db if dic['cod'] == str(station_code)]
     if len(metadata_search) != 1:
@@ -154,8 +203,7 @@ def gaugestation_clasification(station_code, return_type=True, metadata_db=__dat
     '''
 
     #Read metadata DB
-    with open(metadata_db, 'rb') as config_dictionary_file: 
-        metadata_db = pickle.load(config_dictionary_file) 
+    metadata_db = read_metadata(metadata_db)
     
     #Search metadata for the station_code
     metadata_search = [dic for dic in metadata_db if dic['cod'] == str(station_code)]
@@ -163,14 +211,6 @@ def gaugestation_clasification(station_code, return_type=True, metadata_db=__dat
         raise Exception("Duplicated station_code .. please fixed before continuing.")
     metadata_search_dict = metadata_search[0]
 
-    variables_by_typestation = {
-    'meteo_manual_realtime':['DATE','TX','TN','HUM','PREC_D'],
-    'meteo_manual_deferred':['DATE','TX','TN','HUM','PREC_D'],
-    'meteo_automatic':['DATE','HOUR','TEMP','PREC_H','HUM','W_DIR','W_VEL'],
-    'hidro_manual_realtime':['DATE','LEVEL_06','LEVEL_10','LEVEL_14','LEVEL_18'],
-    'hidro_manual_deferred':['DATE','HOUR','LEVEL','PREC_H']
-    }
-
     if metadata_search_dict['ico'] == 'M':
         var_01 = 'meteo'
     elif metadata_search_dict['ico'] == 'H':
@@ -188,36 +228,51 @@ def gaugestation_clasification(station_code, return_type=True, metadata_db=__dat
         raise Exception("gaugestation_clasification: 'estado' key do not match with 'DIFERIDO', 'READL' or 'AUTOMATICA'.")
     
     if return_type:
-        return variables_by_typestation['%s_%s' % (var_01,var_02)]
+        return list(variables_by_typestation['%s_%s' % (var_01,var_02)])
     else:
         return '%s_%s' % (var_01,var_02)
 
-def add_altitude(code, state, type_station, category_station, old_code=None):
+def altitude_url(code, state, type_station, category_station, old_code=None):
+    '''URL of the SENAMHI page with the altitude of the gauge station (see add_altitude).'''
+    if state == "AUTOMATICA":
+        return "https://www.senamhi.gob.pe/mapas/mapa-estaciones-2/map_red_graf.php?cod={}&estado={}&tipo_esta={}&cate={}".format(code, state, type_station, category_station)
+    else:
+        return "https://www.senamhi.gob.pe/mapas/mapa-estaciones-2/map_red_graf.php?cod={}&estado={}&tipo_esta={}&cate={}&cod_old={}".format(code, state, type_station, category_station, old_code)
+
+def add_altitude(code, state, type_station, category_station, old_code=None, cache=None):
     '''Add altitude (to the metadata dictionary). This step is extremely necessary to make queries (.php?..).
     Args:
     -code: Station code (SENAMHI new code's format)
     -state: METEOROLOGICA o HIDROLOGICA.
     -type_station: DIFERIDO, REALTIME and AUTOMATICO.    
     -old_code: Station code (SENAMHI old code's format)
+    -cache: SharedCache object (see phd_scraper.cache). Whether it is given, the altitude is saved and reused
+     while it is younger than cache.altitude_max_age.
     '''    
-    if state == "AUTOMATICA":
-        url = "https://www.senamhi.gob.pe/mapas/mapa-estaciones-2/map_red_graf.php?cod={}&estado={}&tipo_esta={}&cate={}".format(code, state, type_station, category_station)
-    else:
-        url = "https://www.senamhi.gob.pe/mapas/mapa-estaciones-2/map_red_graf.php?cod={}&estado={}&tipo_esta={}&cate={}&cod_old={}".format(code, state, type_station, category_station, old_code)
+    url = altitude_url(code, state, type_station, category_station, old_code)
+    if cache is not None:
+        cached = cache.get('altitude', url, max_age=cache.altitude_max_age)
+        if cached is not None:
+            return cached[1]
     response = requests.get(url)
+    response.raise_for_status()
     soup = BeautifulSoup(response.text, "html.parser")
+    alt = None
     for s in soup.find_all("td"):
         if len(s) > 0:
             if "msnm" in s.text:
                 alt = s.text.split(" ")[0]
+    if alt is None:
+        raise Exception("add_altitude: the altitude was not found in %s" % url)
+    if cache is not None:
+        cache.put('altitude', url, alt)
     return alt
 
-def data_senamhi_realtime(station, year_month, quiet=False):
-    ''' Transform SENAMHI HTML tables into pd.DataFrame.
+def realtime_url(station, year_month):
+    ''' URL of the SENAMHI HTML page of one station-month.
     Args:
-    -station: Metadata of the gauge station as a dictionary
+    -station: Metadata of the gauge station as a dictionary (with altitude)
     -year_month: %Y%m Date format (it is SENAMHI format)
-    -quiet: Logical. Suppress info message.
     '''
     cod = station["cod"]
     tipo_esta = station["ico"]
@@ -225,14 +280,70 @@ def data_senamhi_realtime(station, year_month, quiet=False):
     cod_old = station["cod_old"] if "cod_old" in station.keys() else ""
     cate_esta = station["cate"]
     altitud = station["alt"]
-    
+
     url = "https://www.senamhi.gob.pe/mapas/mapa-estaciones-2/_dato_esta_tipo02.php"
-    new_url = "{}?estaciones={}&CBOFiltro={}&t_e={}&estado={}&cod_old={}&cate_esta={}&alt={}".format(
-            url, cod, year_month, tipo_esta, estado, cod_old, cate_esta, altitud)    
+    return "{}?estaciones={}&CBOFiltro={}&t_e={}&estado={}&cod_old={}&cate_esta={}&alt={}".format(
+            url, cod, year_month, tipo_esta, estado, cod_old, cate_esta, altitud)
+
+def response_key(station, year_month):
+    ''' Cache key of the SENAMHI HTML page of one station-month (see phd_scraper.cache).
+    It is realtime_url without the altitude, so it can be computed before add_altitude (see phd_scraper.planner).
+    Args:
+    -station: Metadata of the gauge station as a dictionary
+    -year_month: %Y%m Date format (it is SENAMHI format)
+    '''
+    return realtime_url(dict(station, alt=''), year_month)
+
+def response_max_age(cache, year_month, today=None):
+    ''' Seconds the cached SENAMHI HTML page of one station-month is reused.
+    SENAMHI still adds data to the current and the previous month, so their pages use
+    cache.open_month_max_age (by default 0, not reused) instead of cache.response_max_age.
+    Args:
+    -cache: SharedCache object (see phd_scraper.cache).
+    -year_month: %Y%m Date format (it is SENAMHI format)
+    -today: datetime; By default datetime.now().
+    '''
+    today = today or datetime.now()
+    previous_month = (today.year - 1, 12) if today.month == 1 else (today.year, today.month - 1)
+    if (int(year_month[:4]), int(year_month[4:6])) >= previous_month:
+        return cache.open_month_max_age
+    return cache.response_max_age
+
+def fetch_senamhi_realtime(station, year_month, quiet=False, cache=None):
+    ''' Download the SENAMHI HTML page of one station-month.
+    Error responses (4xx, 5xx) raise requests.HTTPError.
+    Args:
+    -station: Metadata of the gauge station as a dictionary
+    -year_month: %Y%m Date format (it is SENAMHI format)
+    -quiet: Logical. Suppress info message.
+    -cache: SharedCache object (see phd_scraper.cache). Whether it is given, the page is reused
+     while it is younger than response_max_age(cache, year_month). The page is not saved here, it is saved
+     by data_senamhi_realtime and download_* once it is parsed without errors.
+    '''
+    return _fetch_senamhi_realtime(station, year_month, quiet=quiet, cache=cache)[0]
+
+def _fetch_senamhi_realtime(station, year_month, quiet=False, cache=None):
+    '''fetch_senamhi_realtime that returns the tuple (html, cached); cached is True when the page comes from cache.'''
+    new_url = realtime_url(station, year_month)
+    if cache is not None:
+        cached = cache.get('response', response_key(station, year_month), max_age=response_max_age(cache, year_month))
+        if cached is not None:
+            return cached[1], True
     if not quiet:
         print(new_url)
     s = requests.get(new_url)
-    html = s.text
+    s.raise_for_status()
+    return s.text, False
+
+def _store_response(cache, station, year_month, html):
+    '''Save a parsed page in cache (see fetch_senamhi_realtime).'''
+    cache.put('response', response_key(station, year_month), html)
+
+def html_tables(html):
+    ''' Cells (strings) of the HTML tables of a SENAMHI page.
+    Args:
+    -html: String; HTML page returned by fetch_senamhi_realtime.
+    '''
     soup = BeautifulSoup(html, 'html.parser')
     tables = [
         [
@@ -241,7 +352,16 @@ def data_senamhi_realtime(station, year_month, quiet=False):
         ] 
         for table in soup.find_all('table')
     ]
-    
+    return tables
+
+def tables_to_frame(tables, station):
+    ''' Transform the cells of a SENAMHI page (see html_tables) into pd.DataFrame.
+    Args:
+    -tables: List of tables (lists of rows) returned by html_tables.
+    -station: Metadata of the gauge station as a dictionary
+    '''
+    tipo_esta = station["ico"]
+    estado = station["estado"]
     if tipo_esta == "M":
         if estado == "AUTOMATICA":
             cols = ["fecha", "hora", "temp", "pp", "humedad", "dir_viento", "vel_viento"]
@@ -258,11 +378,142 @@ def data_senamhi_realtime(station, year_month, quiet=False):
             df = pd.DataFrame(tables[1][2:], columns=cols)
     return df
 
-def complete_monthly_data(station_data,station_class):
+def parse_senamhi_realtime(html, station):
+    ''' Transform a SENAMHI HTML page into pd.DataFrame.
+    Args:
+    -html: String; HTML page returned by fetch_senamhi_realtime.
+    -station: Metadata of the gauge station as a dictionary
+    '''
+    return tables_to_frame(html_tables(html), station)
+
+def format_senamhi_realtime(total_df, station_code, completedata=True, metadata_db=__datadir__, year_month=None):
+    ''' Rename the columns of a parsed SENAMHI month, replace S/D by np.NaN and complete the missing dates.
+    Args:
+    -total_df: pd.DataFrame returned by parse_senamhi_realtime.
+    -station_code: station new code.
+    -completedata: Logical; Whether it is True the missing dates will be completed with np.NaN.
+    -metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
+    -year_month: %Y%m Date format; Month of the page (see complete_monthly_data).
+    '''
+    total_df.fecha = pd.to_datetime(total_df.fecha).dt.strftime('%Y-%m-%d').apply(str)        
+    total_df.columns = gaugestation_clasification(str(station_code), metadata_db=metadata_db)
+    total_df.replace({'S/D':np.NaN},inplace=True)
+    if completedata:
+        station_class = gaugestation_clasification(station_code,return_type=False,metadata_db=metadata_db)
+        total_df = complete_monthly_data(total_df,station_class,year_month=year_month)
+    return total_df
+
+def fetch_station_list(url=__stations_url__):
+    '''Download the station list (metadata without altitude) of the entire network.
+    The list is embedded in the SENAMHI map webpage as a javascript array (var PruebaTest = [...]).
+    Args:
+    -url: SENAMHI map webpage.
+    '''
+    response = requests.get(url)
+    match = re.search(r'PruebaTest\s*=\s*(\[.*?\])\s*;', response.text, re.DOTALL)
+    if match is None:
+        raise Exception("fetch_station_list: the station list was not found in %s" % url)
+    stations = json.loads(match.group(1))
+    for station in stations:
+        station['cod'] = str(station['cod'])
+        if not station.get('cod_old'):
+            station.pop('cod_old', None)
+    return stations
+
+def diff_metadata(old_metadata, new_metadata):
+    '''Compare two versions of the metadata of the entire network.
+    Args:
+    -old_metadata: List that contains dictionaries; Previous metadata.
+    -new_metadata: List that contains dictionaries; New metadata.
+    Returns:
+    -Dictionary with the keys 'added' and 'removed' (lists of station codes) and
+     'changed' (dictionary {station_code: {key: (old_value, new_value)}}).
+    '''
+    old_by_cod = dict((dic['cod'], dic) for dic in old_metadata)
+    new_by_cod = dict((dic['cod'], dic) for dic in new_metadata)
+    changed = {}
+    for cod in set(old_by_cod) & set(new_by_cod):
+        old_station, new_station = old_by_cod[cod], new_by_cod[cod]
+        fields = dict((key, (old_station.get(key), new_station.get(key)))
+                      for key in set(old_station) | set(new_station)
+                      if old_station.get(key) != new_station.get(key))
+        if fields:
+            changed[cod] = fields
+    return {'added': sorted(set(new_by_cod) - set(old_by_cod)),
+            'removed': sorted(set(old_by_cod) - set(new_by_cod)),
+            'changed': changed}
+
+def _station_altitude(station):
+    '''add_altitude for a metadata dictionary (None if the altitude is not available).'''
+    try:
+        return add_altitude(station["cod"], station["estado"], station["ico"], station["cate"], station.get("cod_old"))
+    except Exception as error:
+        _logger.warning("add_altitude failed for %s: %r", station["cod"], error)
+        return None
+
+def refresh_metadata(metadata_db=__datadir__, out_dir=None, workers=16, stations=None, quiet=False):
+    '''Rebuild se_hydrometeo.dictionary (station list + altitude) as a new versioned file.
+    The altitude of each station is requested concurrently. When it is not available
+    the altitude of the previous metadata is kept.
+    Args:
+    -metadata_db: Pickle object (List that contains dictionaries); Current metadata of the entire network.
+    -out_dir: Folder of the new versioned file. By default the folder of metadata_db.
+    -workers: Number of concurrent add_altitude requests.
+    -stations: List that contains dictionaries; Station list. By default fetch_station_list().
+    -quiet: Logical. Suppress info message.
+    Returns:
+    -Tuple (filename of the new metadata, diff_metadata(old, new)).
+    '''
+    with open(metadata_db, 'rb') as config_dictionary_file: 
+        old_metadata = pickle.load(config_dictionary_file)
+    old_by_cod = dict((dic['cod'], dic) for dic in old_metadata)
+    if stations is None:
+        stations = fetch_station_list()
+    new_metadata = [dict(station) for station in stations]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        altitudes = list(executor.map(_station_altitude, new_metadata))
+    for station, alt in zip(new_metadata, altitudes):
+        if alt is None:
+            alt = old_by_cod.get(station['cod'], {}).get('alt')
+        if alt is not None:
+            station['alt'] = alt
+
+    diff = diff_metadata(old_metadata, new_metadata)
+    if out_dir is None:
+        out_dir = os.path.dirname(os.path.abspath(metadata_db))
+    filename = os.path.join(out_dir, 'se_hydrometeo_%s.dictionary' % datetime.now().strftime('%Y%m%d%H%M%S'))
+    fd, tmp_filename = tempfile.mkstemp(dir=out_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as config_dictionary_file:
+        pickle.dump(new_metadata, config_dictionary_file)
+    os.replace(tmp_filename, filename)
+
+    if not quiet:
+        print('%s: %s added, %s removed, %s changed' % (filename, len(diff['added']),
+                                                         len(diff['removed']), len(diff['changed'])))
+    return filename, diff
+
+def data_senamhi_realtime(station, year_month, quiet=False, cache=None):
+    ''' Transform SENAMHI HTML tables into pd.DataFrame.
+    Args:
+    -station: Metadata of the gauge station as a dictionary
+    -year_month: %Y%m Date format (it is SENAMHI format)
+    -quiet: Logical. Suppress info message.
+    -cache: SharedCache object (see phd_scraper.cache).
+    '''
+    html, cached = _fetch_senamhi_realtime(station, year_month, quiet=quiet, cache=cache)
+    total_df = parse_senamhi_realtime(html, station)
+    if cache is not None and not cached:
+        _store_response(cache, station, year_month, html)
+    return total_df
+
+def complete_monthly_data(station_data,station_class,year_month=None):
     '''Complete missing dates with np.NaN.
     Args:
     - station_data: Station monthly data in pd.DataFrame format.
     - station_class: String; Indicate the class of the gauge station.
+    - year_month: %Y%m Date format; Month of the data. By default the most frequent month of station_data
+      (it is needed when station_data has no rows, e.g. a month without data).
     '''
     match_arg = station_class.split('_')[-1]
     if match_arg == 'automatic':
@@ -270,8 +521,9 @@ def complete_monthly_data(station_data,station_class):
         complete_date = station_data['DATE']+" "+station_data['HOUR']+':00'
         station_data['DATETIME'] = pd.to_datetime(complete_date)       
         station_data.drop(['DATE','HOUR'],inplace=True,axis = 1)
-        year_month = station_data['DATETIME'].map(lambda x: '%s_%02d'%(x.year,x.month)).mode()[0]
-        year, month = map(lambda x:int(x), year_month.split('_'))
+        if year_month is None:
+            year_month = station_data['DATETIME'].map(lambda x: '%s%02d'%(x.year,x.month)).mode()[0]
+        year, month = int(year_month[:4]), int(year_month[4:6])
         last_day = monthrange(year, month)[1]
         ## Init & Last date
         init_day_dt = datetime(year, month, 1, hour=0)
@@ -290,8 +542,9 @@ def complete_monthly_data(station_data,station_class):
         return df
     elif match_arg == 'realtime' or match_arg == 'deferred':
         # Creating a complete time serie
-        year_month = pd.to_datetime(station_data['DATE']).map(lambda x: '%s_%02d'%(x.year,x.month)).mode()[0]
-        year, month = map(lambda x:int(x), year_month.split('_'))
+        if year_month is None:
+            year_month = pd.to_datetime(station_data['DATE']).map(lambda x: '%s%02d'%(x.year,x.month)).mode()[0]
+        year, month = int(year_month[:4]), int(year_month[4:6])
         last_day = monthrange(year, month)[1]
         ## Init & Last date
         init_day_dt = datetime(year, month, 1)
@@ -308,25 +561,23 @@ def complete_monthly_data(station_data,station_class):
     else:
         raise Exception('station_class do not match with deferred, realtime or automatic')
 
-def download_one_month(station_code, date, completedata=True, specific=False, quiet=False, metadata_db=__datadir__):
-    '''Download month by month and station by station the senamhi real-time dataset
-       Args:
-        - station_code: station new code.
-        - date: Date to download in the format %Y-%m-%d (e.g. 2019-01-10).
-        - completedata: Logical; Whether it is True the missing dates will be completed with np.NaN.
-        - specific: Logical; Whether it is True (False) the specific day (month) will be downloaded.    
-        - metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
-        - quiet: Logical. Suppress info message.
-    '''    
+def _download_month(station_code, date, completedata=True, quiet=False, metadata_db=__datadir__, parse_cache=None, strict=False, cache=None):
+    '''Download one month of the senamhi real-time dataset.
+       Return a tuple (pd.DataFrame, page_hash). page_hash is the content hash (sha1) of the downloaded
+       page, or None when the download failed and the month was filled with np.NaN. When the page has
+       the same hash than the one stored in parse_cache, the stored parse is returned.
+       When cache (SharedCache) is given and parse_cache is not, its 'parsed' namespace is used as parse_cache.
+    '''
+    if parse_cache is None and cache is not None:
+        parse_cache = cache.namespace('parsed')
     #Read metadata DB
-    with open(metadata_db, 'rb') as config_dictionary_file: 
-        metadata_db = pickle.load(config_dictionary_file) 
+    metadata = read_metadata(metadata_db)
     
     #Search metadata for the station_code
-    metadata_search = [dic for dic in metadata_db if dic['cod'] == str(station_code)]
+    metadata_search = [dic for dic in metadata if dic['cod'] == str(station_code)]
     if len(metadata_search) != 1:
         raise Exception("Duplicated station_code .. please fixed before continuing.")
-    metadata_search_dict = metadata_search[0]
+    metadata_search_dict = dict(metadata_search[0])
     
     ## add altitude
     if "cod_old" in metadata_search_dict.keys():
@@ -334,12 +585,14 @@ def download_one_month(station_code, date, completedata=True, specific=False, qu
                            metadata_search_dict["estado"],
                            metadata_search_dict["ico"],
                            metadata_search_dict["cate"],
-                           metadata_search_dict["cod_old"])
+                           metadata_search_dict["cod_old"],
+                           cache=cache)
     else:
         alt = add_altitude(metadata_search_dict["cod"], 
                            metadata_search_dict["estado"], 
                            metadata_search_dict["ico"], 
-                           metadata_search_dict["cate"])
+                           metadata_search_dict["cate"],
+                           cache=cache)
     metadata_search_dict["alt"] = alt
 
     #Fix date
@@ -347,28 +600,109 @@ def download_one_month(station_code, date, completedata=True, specific=False, qu
     date_senamhi_format = "%s%02d" % (date_datetime.year,date_datetime.month)
 
     #Get Data    
-    gaugestation_columns = gaugestation_clasification(str(station_code))
+    gaugestation_columns = gaugestation_clasification(str(station_code), metadata_db=metadata_db)
     try:            
-        total_df = data_senamhi_realtime(station = metadata_search_dict,year_month = date_senamhi_format,quiet=quiet)
-        total_df.fecha = pd.to_datetime(total_df.fecha).dt.strftime('%Y-%m-%d').apply(str)        
-        total_df.columns = gaugestation_columns
-        total_df.replace({'S/D':np.NaN},inplace=True)
-        if completedata:
-            station_class = gaugestation_clasification(station_code,return_type=False)
-            total_df = complete_monthly_data(total_df,station_class)
-        else:
-            pass               
+        html, html_cached = _fetch_senamhi_realtime(station = metadata_search_dict,year_month = date_senamhi_format,quiet=quiet,cache=cache)
+        # The raw page is saved in cache just when it is parsed without errors
+        store_response = cache is not None and not html_cached
+        html_hash = hashlib.sha1(html.encode('utf-8')).hexdigest()
+        if parse_cache is not None:
+            cache_key = '%s_%s_%d' % (station_code, date_senamhi_format, completedata)
+            cached = parse_cache.get(cache_key)
+            if cached is not None and cached[0] == html_hash:
+                if store_response:
+                    _store_response(cache, metadata_search_dict, date_senamhi_format, html)
+                return cached[1], html_hash
+        total_df = parse_senamhi_realtime(html, metadata_search_dict)
+        # A page without rows (no data this month) is a month of np.NaN, not an error
+        total_df = format_senamhi_realtime(total_df, station_code, completedata=completedata, metadata_db=metadata_db,
+                                           year_month=date_senamhi_format)
+        if parse_cache is not None:
+            parse_cache.put(cache_key, html_hash, total_df)
+        if store_response:
+            _store_response(cache, metadata_search_dict, date_senamhi_format, html)
     except:        
+        if strict:
+            raise
         num_days = monthrange(date_datetime.year, date_datetime.month)[1]
         dates_list = [datetime(date_datetime.year, date_datetime.month, day) for day in range(1, num_days+1)]
         total_df = pd.DataFrame({},index=dates_list,columns=gaugestation_columns)        
         total_df.DATE = dates_list                
+        return total_df, None
+    return total_df, html_hash
 
+def download_one_month(station_code, date, completedata=True, specific=False, quiet=False, metadata_db=__datadir__, parse_cache=None, strict=False, cache=None):
+    '''Download month by month and station by station the senamhi real-time dataset
+       Args:
+        - station_code: station new code.
+        - date: Date to download in the format %Y-%m-%d (e.g. 2019-01-10).
+        - completedata: Logical; Whether it is True the missing dates will be completed with np.NaN.
+        - specific: Logical; Whether it is True (False) the specific day (month) will be downloaded.    
+        - metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
+        - quiet: Logical. Suppress info message.
+        - parse_cache: ParseCache object (see phd_scraper.cache). Whether it is given, the parse of an
+          unchanged page (same content hash) is reused.
+        - strict: Logical; Whether it is True a failed download raises the error instead of returning
+          a month filled with np.NaN.
+        - cache: SharedCache object (see phd_scraper.cache). Raw pages, parsed months and altitudes are
+          saved and reused (it can be shared by several processes).
+    '''    
+    total_df, _ = _download_month(station_code=station_code, date=date, completedata=completedata, quiet=quiet,
+                                  metadata_db=metadata_db, parse_cache=parse_cache, strict=strict, cache=cache)
     if specific:
         total_df = total_df[total_df.DATE == date]
     return total_df
 
-def download(station_code, init_date, last_date, to_csv = None, completedata=True, specific=False, quiet=False, metadata_db=__datadir__):
+def download_days(stations, dates, completedata=True, quiet=False, metadata_db=__datadir__, cache=None):
+    '''Download specific days for several stations.
+       The requested days are grouped by (station, month), so each month is downloaded and
+       parsed just once and all the requested days are sliced from it.
+       Args:
+        - stations: List of station new codes.
+        - dates: List of dates to download in the format %Y-%m-%d (e.g. 2019-01-10).
+        - completedata: Logical; Whether it is True the missing dates will be completed with np.NaN.
+        - metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
+        - quiet: Logical. Suppress info message.
+        - cache: SharedCache object (see phd_scraper.cache).
+       Returns:
+        - Dictionary {station_code: pd.DataFrame} with the rows of the requested days.
+    '''
+    days = sorted(set(datetime.strptime(date, "%Y-%m-%d").strftime("%Y-%m-%d") for date in dates))
+    days_by_month = {}
+    for day in days:
+        days_by_month.setdefault(day[:7], []).append(day)
+
+    stations_data = {}
+    for station_code in stations:
+        station_data_complete = pd.DataFrame({})
+        for year_month, month_days in sorted(days_by_month.items()):
+            if not quiet:
+                print('Processing: %s %s' % (station_code, year_month))
+            month_df = download_one_month(station_code=station_code, date=month_days[0], quiet=quiet,
+                                          completedata=completedata, metadata_db=metadata_db, cache=cache)
+            month_dates = pd.to_datetime(month_df.DATE).dt.strftime('%Y-%m-%d')
+            station_data = month_df[month_dates.isin(month_days).values]
+            station_data_complete = pd.concat([station_data_complete, station_data]).reset_index(drop=True)
+        stations_data[str(station_code)] = station_data_complete
+    return stations_data
+
+def _signature_path(filename):
+    '''Filename of the signature saved next to the output of download (e.g. test.csv -> test.csv.sha1).'''
+    return filename + '.sha1'
+
+def _output_signature(station_code, range_date, completedata, specific, page_hashes):
+    '''Hash of a download query (station, months, options) and of the content hash of its pages.'''
+    query = [str(station_code), list(range_date), bool(completedata), bool(specific), list(page_hashes)]
+    return hashlib.sha1(json.dumps(query).encode('utf-8')).hexdigest()
+
+def _read_signature(filename):
+    try:
+        with open(_signature_path(filename)) as signature_file:
+            return signature_file.read().strip()
+    except (IOError, OSError):
+        return None
+
+def download(station_code, init_date, last_date, to_csv = None, completedata=True, specific=False, quiet=False, metadata_db=__datadir__, parse_cache=None, rollups=False, cache=None, to_arrow=None):
     '''Download SENAMHI hydrometeorology data by time range
        Args:
         - station_code: station new_code.
@@ -379,7 +713,17 @@ def download(station_code, init_date, last_date, to_csv = None, completedata=Tru
         - specific: Logical; Whether it is True (False) the specific day (month) will be downloaded.            
         - metadata_db: Pickle object (List that contains dictionaries); Represent the metadata of the entire network.
         - quiet: Logical. Suppress info message.
+        - parse_cache: ParseCache object (see phd_scraper.cache). Whether it is given, unchanged pages are
+          not parsed again and to_csv is not rewritten when it holds the output of the same query (station,
+          months and options) over the same pages. The hash of the query and pages is saved in <to_csv>.sha1.
+        - rollups: Logical; Whether it is True the daily and monthly aggregates are saved next to
+          to_csv (see phd_scraper.rollup). It needs to_csv.
+        - cache: SharedCache object (see phd_scraper.cache). Raw pages, parsed months and altitudes are
+          saved and reused (it can be shared by several processes).
+        - to_arrow: String; Output filename of an Arrow IPC file (see phd_scraper.export).
     '''        
+    if rollups and to_csv is None:
+        raise Exception("download: rollups=True needs to_csv (the aggregates are saved next to it)")
     seq_date = pd.date_range(start = init_date,
                              end = last_date,
                              freq = 'MS').tolist()
@@ -389,16 +733,48 @@ def download(station_code, init_date, last_date, to_csv = None, completedata=Tru
         range_date = [datetime.strftime(date, '%Y-%m-%d') for date in seq_date]    
 
     if not quiet:
-        show_message(station_code)
+        show_message(station_code, metadata_db=metadata_db)
     
     station_data_complete = pd.DataFrame({})
+    page_hashes = []
     for month in range_date:
         print('Processing: ' + month)
-        station_data = download_one_month(station_code = station_code,date = month, quiet=quiet, completedata=completedata,specific=specific)        
+        station_data, page_hash = _download_month(station_code = station_code,date = month, quiet=quiet, completedata=completedata,
+                                                metadata_db=metadata_db, parse_cache=parse_cache, cache=cache)
+        if specific:
+            station_data = station_data[station_data.DATE == month]
+        page_hashes.append(page_hash)
         station_data_complete = pd.concat([station_data_complete,station_data]).reset_index(drop = True)            
     
+    if to_arrow is not None:
+        station_class = gaugestation_clasification(station_code, return_type=False, metadata_db=metadata_db)
+        export.write_ipc(station_data_complete, station_class, to_arrow, station_code=station_code)
+
     if to_csv is not None:
-        station_data_complete.to_csv(to_csv, index=False)
+        # The signature is only kept when every page was downloaded and the caches are used
+        signature = None
+        if (parse_cache is not None or cache is not None) and None not in page_hashes:
+            signature = _output_signature(station_code, range_date, completedata, specific, page_hashes)
+        if signature is not None and os.path.exists(to_csv) and _read_signature(to_csv) == signature:
+            if not quiet:
+                print('Unchanged: %s is not rewritten' % to_csv)
+            # The aggregates of an unchanged file are written when they were not requested before
+            if rollups and not all(os.path.exists(rollup.rollup_path(to_csv, freq)) for freq in ('D', 'M')):
+                rollup.save_rollups(station_data_complete, to_csv)
+        else:
+            station_data_complete.to_csv(to_csv, index=False)
+            if signature is not None:
+                with open(_signature_path(to_csv), 'w') as signature_file:
+                    signature_file.write(signature)
+            elif os.path.exists(_signature_path(to_csv)):
+                os.remove(_signature_path(to_csv))
+            if rollups:
+                rollup.save_rollups(station_data_complete, to_csv)
+            else:
+                # Aggregates of a previous output would not match the new to_csv
+                for freq in ('D', 'M'):
+                    if os.path.exists(rollup.rollup_path(to_csv, freq)):
+                        os.remove(rollup.rollup_path(to_csv, freq))
     else:
         print(station_data_complete)
         return station_data_complete
@@ -463,6 +839,11 @@ def parse_args(args):
         default=__datadir__,
         type=str,
         metavar="str")
+    parser.add_argument(
+        "--refresh_metadata",
+        dest="refresh_metadata",
+        help="Rebuild the metadata of gauge stations as a new versioned file (in the --metadata_db folder)",
+        action="store_true")
     parser.add_argument(
         "--quiet",
         dest="quiet",
@@ -505,9 +886,15 @@ def main(args):
     """
     args = parse_args(args)
     setup_logging(args.loglevel)
+    if args.refresh_metadata:
+        _logger.debug("Starting metadata refresh...")
+        refresh_metadata(metadata_db=args.metadata_db)
+        _logger.info("Script ends here")
+        return
     _logger.debug("Starting download...")    
-    download(args.station_code,args.init_date, args.last_date, args.completedata, 
-                        args.specific, args.to_csv, args.metadata_db, args.quiet)
+    download(station_code=args.station_code, init_date=args.init_date, last_date=args.last_date,
+             to_csv=args.to_csv, completedata=args.completedata, specific=args.specific,
+             quiet=args.quiet, metadata_db=args.metadata_db)
     _logger.info("Script ends here")
 
 def run():
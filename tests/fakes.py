@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""Offline SENAMHI pages for the tests (requests.get is replaced by FakeSenamhi)."""
+
+import re
+from calendar import monthrange
+
+import requests
+
+
+class FakeResponse(object):
+    """Minimal requests.Response."""
+
+    def __init__(self, text, status_code=200, url=''):
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.status_code = status_code
+        self.url = url
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError('%s Error for url: %s' % (self.status_code, self.url), response=self)
+
+
+def altitude_page(alt='431'):
+    return '<table><tr><td>Altitud :</td><td>%s msnm.</td></tr></table>' % alt
+
+
+def manual_page(year, month, missing_days=(), prec='1.5'):
+    """meteo_manual_* page: two header rows and DATE, TX, TN, HUM, PREC_D by day."""
+    rows = ''.join('<tr><td>%d-%02d-%02d</td><td>%s</td><td>10.1</td><td>80</td><td>%s</td></tr>'
+                   % (year, month, day, 20 + day % 3, prec)
+                   for day in range(1, monthrange(year, month)[1] + 1) if day not in missing_days)
+    return ('<table><tr><td>Estacion</td></tr></table>'
+            '<table><tr><td>Fecha</td></tr><tr><td>Dia</td></tr>%s</table>' % rows)
+
+
+def automatic_page(year, month, missing_days=()):
+    """meteo_automatic page: one header row and DATE, HOUR (HH:MM), TEMP, PREC_H, HUM, W_DIR, W_VEL by hour."""
+    rows = ''.join('<tr><td>%d-%02d-%02d</td><td>%02d:00</td><td>%s</td><td>0.2</td><td>80</td>'
+                   '<td>90</td><td>2.5</td></tr>' % (year, month, day, hour, 10 + hour % 5)
+                   for day in range(1, monthrange(year, month)[1] + 1) if day not in missing_days
+                   for hour in range(24))
+    return ('<table><tr><td>Estacion</td></tr></table>'
+            '<table><tr><td>Fecha</td></tr>%s</table>' % rows)
+
+
+def historic_page(year=2018, days=365, value='1.5'):
+    """se_historic page: highcharts categories (years) and series of PREC, TX and TN."""
+    values = ','.join([value] * days)
+    return ('<script type="text/javascript">var chart;</script>'
+            '<script type="text/javascript">'
+            "xAxis: [{categories: [%s ]}], series: [{name: 'PREC', data: [%s ]}, [%s,], [%s,]]"
+            '</script>' % (','.join(["'%s'" % year] * days), values, values, values))
+
+
+class FakeSenamhi(object):
+    """Replacement of requests.get that serves generated SENAMHI pages.
+    Args:
+    -status: Dictionary {%Y%m: HTTP status of the month pages} (200 by default).
+    -missing_days: Dictionary {%Y%m: days without rows}.
+    -pages: Dictionary {%Y%m: HTML page served instead of the generated one}.
+    """
+
+    def __init__(self, status=None, missing_days=None, alt='431', pages=None):
+        self.status = status or {}
+        self.missing_days = missing_days or {}
+        self.pages = pages or {}
+        self.alt = alt
+        self.calls = []
+
+    def __call__(self, url, *args, **kwargs):
+        self.calls.append(url)
+        if 'map_red_graf.php' in url:
+            return FakeResponse(altitude_page(self.alt), url=url)
+        if 'descarga/?cod=' in url:
+            return FakeResponse(historic_page(), url=url)
+        match = re.search(r'CBOFiltro=(\d{4})(\d{2})', url)
+        year_month = match.group(1) + match.group(2)
+        if self.status.get(year_month, 200) != 200:
+            return FakeResponse('<html>Service Unavailable</html>', self.status[year_month], url=url)
+        if year_month in self.pages:
+            return FakeResponse(self.pages[year_month], url=url)
+        year, month = int(match.group(1)), int(match.group(2))
+        missing_days = self.missing_days.get(year_month, ())
+        if 'estado=AUTOMATICA' in url:
+            return FakeResponse(automatic_page(year, month, missing_days), url=url)
+        return FakeResponse(manual_page(year, month, missing_days), url=url)
+
+    def month_calls(self):
+        return [url for url in self.calls if '_dato_esta_tipo02.php' in url]
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `phd_scraper.cache`."""
+
+
+import os
+import time
+import pickle
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+from phd_scraper.cache import ParseCache, SharedCache
+
+
+def entry_size(value):
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def process_work(args):
+    # Runs in another process: it opens its own SharedCache over the same file
+    path, max_bytes, worker = args
+    cache = SharedCache(path, max_bytes=max_bytes, access_interval=0)
+    for n in range(100):
+        cache.put('response', '%s_%s' % (worker, n), 'x' * 100)
+        cache.get('response', '%s_%s' % (1 - worker, n))
+    cache.flush()
+    return cache.get('response', '%s_99' % worker) is not None
+
+
+class CacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, 'cache.sqlite')
+
+
+class Test_ParseCache(CacheTestCase):
+
+    def test_000_get_put(self):
+        parse_cache = ParseCache(os.path.join(self.tmp_dir, 'parse'))
+        self.assertIsNone(parse_cache.get('100090_201901_1'))
+        parse_cache.put('100090_201901_1', 'abc', {'TX': [1.0]})
+        self.assertEqual(parse_cache.get('100090_201901_1'), ('abc', {'TX': [1.0]}))
+
+
+class Test_SharedCache(CacheTestCase):
+
+    def test_000_get_put(self):
+        cache = SharedCache(self.path)
+        self.assertIsNone(cache.get('response', 'url'))
+        cache.put('response', 'url', '<html>', payload_hash='h')
+        self.assertEqual(cache.get('response', 'url'), ('h', '<html>'))
+        self.assertTrue(cache.contains('response', 'url'))
+        self.assertFalse(cache.contains('altitude', 'url'))
+        self.assertEqual(cache.namespace('response').get('url'), ('h', '<html>'))
+
+    def test_001_max_age(self):
+        cache = SharedCache(self.path)
+        cache.put('response', 'url', '<html>')
+        time.sleep(0.05)
+        self.assertIsNone(cache.get('response', 'url', max_age=0.01))
+        self.assertFalse(cache.contains('response', 'url', max_age=0.01))
+        self.assertIsNotNone(cache.get('response', 'url', max_age=60))
+
+    def test_002_running_total(self):
+        cache = SharedCache(self.path)
+        cache.put('response', 'a', 'x' * 100)
+        cache.put('response', 'b', 'y' * 200)
+        cache.put('response', 'a', 'z' * 50)
+        self.assertEqual(cache.size(), entry_size('z' * 50) + entry_size('y' * 200))
+        # The total is shared with other connections (processes)
+        self.assertEqual(SharedCache(self.path).size(), cache.size())
+
+    def test_003_evicts_least_recently_used(self):
+        value = 'x' * 1000
+        cache = SharedCache(self.path, max_bytes=3 * entry_size(value), access_interval=0)
+        for key in ('a', 'b', 'c'):
+            cache.put('response', key, value)
+            time.sleep(0.01)
+        # 'a' is read, so 'b' becomes the least recently used entry
+        self.assertIsNotNone(cache.get('response', 'a'))
+        cache.put('response', 'd', value)
+        self.assertEqual([key for key in 'abcd' if cache.contains('response', key)], ['a', 'c', 'd'])
+        self.assertEqual(cache.size(), 3 * entry_size(value))
+
+    def test_004_evicts_several_entries(self):
+        small, big = 'x' * 100, 'y' * 1000
+        cache = SharedCache(self.path, max_bytes=entry_size(big) + entry_size(small))
+        for key in ('a', 'b', 'c'):
+            cache.put('response', key, small)
+        cache.put('response', 'big', big)
+        self.assertEqual([key for key in ('a', 'b', 'c', 'big') if cache.contains('response', key)], ['c', 'big'])
+        self.assertLessEqual(cache.size(), cache.max_bytes)
+
+    def test_005_reads_do_not_write(self):
+        cache = SharedCache(self.path, access_interval=0)
+        cache.put('response', 'a', 'x')
+        conn = cache._conn()
+        changes = conn.total_changes
+        for _ in range(10):
+            cache.get('response', 'a')
+        self.assertEqual(conn.total_changes, changes)
+        cache.flush()
+        self.assertEqual(conn.total_changes, changes + 1)
+
+    def test_006_threads(self):
+        cache = SharedCache(self.path, max_bytes=50 * entry_size('x' * 100))
+
+        def work(n):
+            cache.put('response', str(n), 'x' * 100)
+            cache.get('response', str(n // 2))
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(work, range(200)))
+        self.assertTrue(cache.contains('response', '199'))
+        self.assertLessEqual(cache.size(), cache.max_bytes)
+        total = cache._conn().execute('SELECT SUM(size) FROM entries').fetchone()[0]
+        self.assertEqual(cache.size(), total)
+
+
+class Test_SharedCache_processes(CacheTestCase):
+
+    def _run(self, max_bytes):
+        with multiprocessing.get_context('spawn').Pool(2) as pool:
+            return pool.map(process_work, [(self.path, max_bytes, worker) for worker in (0, 1)])
+
+    def test_000_entries_are_shared(self):
+        self.assertEqual(self._run(10 ** 9), [True, True])
+        cache = SharedCache(self.path)
+        self.assertTrue(all(cache.contains('response', '%s_%s' % (worker, n))
+                            for worker in (0, 1) for n in range(100)))
+        self.assertEqual(cache.size(), 200 * entry_size('x' * 100))
+
+    def test_001_limit_and_total(self):
+        max_bytes = 50 * entry_size('x' * 100)
+        self.assertEqual(self._run(max_bytes), [True, True])
+        cache = SharedCache(self.path, max_bytes=max_bytes)
+        self.assertLessEqual(cache.size(), max_bytes)
+        total = cache._conn().execute('SELECT SUM(size) FROM entries').fetchone()[0]
+        self.assertEqual(cache.size(), total)
+
+
+if __name__ == '__main__':
+    unittest.main()
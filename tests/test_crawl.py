@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `phd_scraper.crawl` (requests.get is mocked)."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from phd_scraper import crawl
+
+from . import fakes
+
+
+class CrawlTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.out_dir = os.path.join(self.tmp_dir, 'senamhi')
+        self.senamhi = fakes.FakeSenamhi()
+        patcher = mock.patch('requests.get', side_effect=self.senamhi)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class Test_CrawlJournal(CrawlTestCase):
+
+    def test_000_status(self):
+        journal = crawl.CrawlJournal(os.path.join(self.tmp_dir, 'journal.sqlite'))
+        self.addCleanup(journal.close)
+        jobs = [('100090', '201901'), ('100090', '201902'), ('106057', '201901')]
+        journal.add(jobs)
+        journal.mark_done('100090', '201901', 'a.csv', 'hash')
+        journal.mark_failed('100090', '201902', 'HTTPError')
+        self.assertEqual(journal.summary(), {crawl.DONE: 1, crawl.FAILED: 1, crawl.PENDING: 1})
+        self.assertEqual(journal.unfinished(), [('100090', '201902'), ('106057', '201901')])
+        self.assertEqual(journal.unfinished([('106057', '201901')]), [('106057', '201901')])
+        self.assertEqual(journal.get('100090', '201901')['hash'], 'hash')
+        # add does not reset finished jobs unless reset=True
+        journal.add(jobs)
+        self.assertEqual(journal.get('100090', '201901')['status'], crawl.DONE)
+        journal.add(jobs, reset=True)
+        self.assertEqual(journal.summary(), {crawl.PENDING: 3})
+
+
+class Test_crawl_resume(CrawlTestCase):
+
+    def test_000_resume_downloads_failed_months(self):
+        self.senamhi.status = {'201902': 503}
+        summary = crawl.crawl(['100090'], '2019-01-01', '2019-03-31', self.out_dir)
+        self.assertEqual(summary, {crawl.DONE: 2, crawl.FAILED: 1})
+        self.assertFalse(os.path.exists(crawl.month_path(self.out_dir, '100090', '201902')))
+
+        self.senamhi.status = {}
+        self.senamhi.calls = []
+        summary = crawl.crawl(['100090'], '2019-01-01', '2019-03-31', self.out_dir, resume=True)
+        self.assertEqual(summary, {crawl.DONE: 3})
+        self.assertEqual(len(self.senamhi.month_calls()), 1)
+        self.assertIn('CBOFiltro=201902', self.senamhi.month_calls()[0])
+        self.assertTrue(os.path.exists(crawl.month_path(self.out_dir, '100090', '201902')))
+
+    def test_001_error_pages_are_not_cached(self):
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.senamhi.status = {'201902': 503}
+        summary = crawl.crawl(['100090'], '2019-01-01', '2019-02-28', self.out_dir, cache_dir=cache_dir)
+        self.assertEqual(summary, {crawl.DONE: 1, crawl.FAILED: 1})
+        self.assertIn('HTTPError', crawl.CrawlJournal(os.path.join(self.out_dir, 'crawl_journal.sqlite'))
+                      .get('100090', '201902')['error'])
+
+        self.senamhi.status = {}
+        self.senamhi.calls = []
+        summary = crawl.crawl(['100090'], '2019-01-01', '2019-02-28', self.out_dir, cache_dir=cache_dir,
+                              resume=True)
+        self.assertEqual(summary, {crawl.DONE: 2})
+        self.assertEqual(len(self.senamhi.month_calls()), 1)
+
+    def test_002_without_resume_everything_is_downloaded(self):
+        crawl.crawl(['100090'], '2019-01-01', '2019-02-28', self.out_dir)
+        self.senamhi.calls = []
+        crawl.crawl(['100090'], '2019-01-01', '2019-02-28', self.out_dir)
+        self.assertEqual(len(self.senamhi.month_calls()), 2)
+
+    def test_003_month_without_data_is_done(self):
+        # A valid page without rows is not an error: the month is saved with coverage 0
+        self.senamhi.missing_days = {'201902': range(1, 29)}
+        for station_code, rows in (('100090', 28), ('4726A602', 28 * 24)):
+            summary = crawl.crawl([station_code], '2019-01-01', '2019-02-28', self.out_dir)
+            self.assertEqual(list(summary), [crawl.DONE])
+            station_data = crawl.read_month(crawl.month_path(self.out_dir, station_code, '201902'))
+            self.assertEqual(len(station_data), rows)
+        journal = crawl.CrawlJournal(os.path.join(self.out_dir, 'crawl_journal.sqlite'))
+        self.addCleanup(journal.close)
+        self.assertEqual(journal.get('100090', '201902')['coverage'], 0.0)
+        self.senamhi.calls = []
+        crawl.crawl(['100090', '4726A602'], '2019-01-01', '2019-02-28', self.out_dir, resume=True)
+        self.assertEqual(self.senamhi.month_calls(), [])
+
+
+class Test_sinks(CrawlTestCase):
+
+    def test_000_arrow_automatic_raw_hours(self):
+        summary = crawl.crawl(['4726A602'], '2019-01-01', '2019-01-31', self.out_dir, sink='arrow',
+                              completedata=False)
+        self.assertEqual(summary, {crawl.DONE: 1})
+        station_data = crawl.read_month(crawl.month_path(self.out_dir, '4726A602', '201901', 'arrow'))
+        self.assertEqual(len(station_data), 31 * 24)
+        self.assertEqual(str(station_data.HOUR.iloc[1]), '01:00:00')
+
+
+class Test_coverage(unittest.TestCase):
+
+    def test_000_daily(self):
+        station_data = pd.DataFrame({'DATE': pd.date_range('2019-02-01', periods=28, freq='D'),
+                                     'TX': [20.0] * 14 + [np.nan] * 14,
+                                     'TN': ['10'] * 7 + ['S/D'] * 21})
+        self.assertAlmostEqual(crawl.month_coverage(station_data, '201902'), (14 + 7) / 56.0)
+
+    def test_001_hourly_missing_rows(self):
+        station_data = pd.DataFrame({'DATE': ['2019-01-01'] * 24, 'HOUR': ['%02d:00' % h for h in range(24)],
+                                     'TEMP': [10.0] * 24})
+        self.assertAlmostEqual(crawl.month_coverage(station_data, '201901'), 1 / 31.0)
+
+    def test_002_no_variables(self):
+        self.assertEqual(crawl.month_coverage(pd.DataFrame({'DATE': []}), '201901'), 0.0)
+
+
+class Test_repair(CrawlTestCase):
+
+    def setUp(self):
+        super(Test_repair, self).setUp()
+        # 201901 complete, 201902 hollow (SENAMHI returned few days), 201903 failed (no file)
+        self.senamhi.missing_days = {'201902': range(1, 25)}
+        self.senamhi.status = {'201903': 503}
+        crawl.crawl(['100090'], '2019-01-01', '2019-03-31', self.out_dir, sink='pickle')
+        self.senamhi.missing_days = {}
+        self.senamhi.status = {}
+        self.senamhi.calls = []
+
+    def test_000_find_gaps(self):
+        gaps = crawl.find_gaps(self.out_dir, threshold=0.5)
+        self.assertEqual([gap[:2] for gap in gaps], [('100090', '201902'), ('100090', '201903')])
+        self.assertAlmostEqual(gaps[0][2], 4 / 28.0)
+        self.assertEqual(gaps[1][2], 0.0)
+        # The failed month is saved with the format of the other months of the station
+        self.assertEqual(gaps[1][3], crawl.month_path(self.out_dir, '100090', '201903', 'pickle'))
+
+    def test_001_missing_file(self):
+        os.remove(crawl.month_path(self.out_dir, '100090', '201901', 'pickle'))
+        gaps = crawl.find_gaps(self.out_dir, threshold=0.5)
+        self.assertEqual([gap[:3] for gap in gaps][0], ('100090', '201901', 0.0))
+
+    def test_002_coverage_is_read_from_the_journal(self):
+        with mock.patch.object(crawl, 'read_month') as read_month:
+            gaps = crawl.find_gaps(self.out_dir, threshold=0.5)
+        read_month.assert_not_called()
+        self.assertEqual(len(gaps), 2)
+
+    def test_003_files_without_journal_are_read_once(self):
+        os.remove(os.path.join(self.out_dir, 'crawl_journal.sqlite'))
+        journal = os.path.join(self.tmp_dir, 'journal.sqlite')
+        with mock.patch.object(crawl, 'read_month', wraps=crawl.read_month) as read_month:
+            gaps = crawl.find_gaps(self.out_dir, threshold=0.5, journal=journal)
+            self.assertEqual(read_month.call_count, 2)
+            self.assertEqual(crawl.find_gaps(self.out_dir, threshold=0.5, journal=journal), gaps)
+            self.assertEqual(read_month.call_count, 2)
+        self.assertEqual([gap[:2] for gap in gaps], [('100090', '201902')])
+
+    def test_004_repair(self):
+        result = crawl.repair(self.out_dir, threshold=0.5)
+        self.assertEqual(sorted(result['repaired']), [('100090', '201902'), ('100090', '201903')])
+        self.assertEqual(len(self.senamhi.month_calls()), 2)
+        self.assertEqual(crawl.find_gaps(self.out_dir, threshold=0.5), [])
+        self.assertTrue(os.path.exists(crawl.month_path(self.out_dir, '100090', '201903', 'pickle')))
+        journal = crawl.CrawlJournal(os.path.join(self.out_dir, 'crawl_journal.sqlite'))
+        self.addCleanup(journal.close)
+        self.assertEqual(journal.summary(), {crawl.DONE: 3})
+        self.assertEqual(journal.get('100090', '201903')['coverage'], 1.0)
+
+    def test_005_dry_run(self):
+        result = crawl.repair(self.out_dir, threshold=0.5, dry_run=True)
+        self.assertEqual(len(result['gaps']), 2)
+        self.assertEqual(result['repaired'], [])
+        self.assertEqual(self.senamhi.calls, [])
+
+
+class Test_main(CrawlTestCase):
+
+    def test_000_filters_stations_and_sink(self):
+        stations_file = os.path.join(self.tmp_dir, 'stations.txt')
+        with open(stations_file, 'w') as station_file:
+            station_file.write('# code,name\n100090,MONTE GRANDE\n106057\n999999\n')
+        crawl.main(['--stations', stations_file, '--filter', 'estado=DIFERIDO', '--init_date', '2019-01-01',
+                    '--last_date', '2019-02-28', '--out_dir', self.out_dir, '--workers', '2', '--sink', 'pickle',
+                    '--cache_dir', os.path.join(self.tmp_dir, 'cache')])
+        # 106057 is REAL and 999999 is not in the metadata
+        self.assertEqual(sorted(name for name in os.listdir(self.out_dir) if not name.startswith('crawl_journal')),
+                         ['100090'])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.out_dir, '100090'))),
+                         ['100090_201901.pickle', '100090_201902.pickle'])
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, 'cache', crawl.CACHE_FILENAME)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `phd_scraper.export`."""
+
+
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from phd_scraper import export
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+def automatic_data(hours):
+    return pd.DataFrame({'DATE': ['2019-01-01'] * len(hours),
+                         'HOUR': hours,
+                         'TEMP': ['10.5', 'S/D', '11'][:len(hours)],
+                         'PREC_H': [0.0, np.nan, 0.2][:len(hours)],
+                         'HUM': [80, 81, 82][:len(hours)],
+                         'W_DIR': [90, 90, 90][:len(hours)],
+                         'W_VEL': [2.5, 2.5, 2.5][:len(hours)]})
+
+
+class Test_columns(unittest.TestCase):
+
+    def test_000_columns_by_class(self):
+        self.assertEqual(export.columns_by_class('se_historic'), ['DATE', 'PREC', 'TX', 'TN'])
+        self.assertEqual(export.columns_by_class('meteo_manual_deferred'), ['DATE', 'TX', 'TN', 'HUM', 'PREC_D'])
+        self.assertRaises(Exception, export.columns_by_class, 'meteo')
+
+
+@unittest.skipIf(pa is None, 'pyarrow is not installed')
+class Test_to_arrow(unittest.TestCase):
+
+    def test_000_hour_formats(self):
+        # Raw pages (completedata=False) use HH:MM, complete_monthly_data uses HH:MM:SS
+        for hours in (['00:00', '01:00', None], ['00:00:00', '01:00:00', None]):
+            batch = export.to_arrow(automatic_data(hours), 'meteo_automatic', station_code='112267')
+            self.assertEqual(batch.schema, export.arrow_schema('meteo_automatic').with_metadata(
+                {'station_class': 'meteo_automatic', 'station_code': '112267'}))
+            self.assertEqual(batch.column(1).to_pylist(), [datetime.time(0, 0), datetime.time(1, 0), None])
+            self.assertEqual(batch.column(2).to_pylist(), [10.5, None, 11.0])
+
+    def test_001_round_trip(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        station_data = pd.DataFrame({'DATE': pd.date_range('2019-01-01', periods=3, freq='D'),
+                                     'PREC': [1.0, np.nan, 0.0], 'TX': [20.0, 21.0, 22.0], 'TN': [10.0, 11.0, np.nan]})
+        for stream in (False, True):
+            filename = export.write_ipc(station_data, 'se_historic', os.path.join(tmp_dir, 'station.arrow'),
+                                        station_code='000396', stream=stream)
+            if stream:
+                table = pa.ipc.open_stream(pa.OSFile(filename)).read_all()
+            else:
+                table = pa.ipc.open_file(pa.memory_map(filename)).read_all()
+            self.assertEqual(table.schema.metadata[b'station_code'], b'000396')
+            result = table.to_pandas()
+            self.assertEqual(list(result.columns), ['DATE', 'PREC', 'TX', 'TN'])
+            self.assertEqual(list(pd.to_datetime(result.DATE)), list(station_data.DATE))
+            for col in ('PREC', 'TX', 'TN'):
+                np.testing.assert_array_equal(result[col].values, station_data[col].values)
+
+
+if __name__ == '__main__':
+    unittest.main()
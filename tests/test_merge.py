@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `phd_scraper.merge`."""
+
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from phd_scraper import merge
+
+
+class Test_merge_series(unittest.TestCase):
+
+    def setUp(self):
+        # se_historic: 2019-01-01 .. 2019-01-03; se_hydrometeo: 2019-01-02 .. 2019-01-04
+        self.historic = pd.DataFrame({'DATE': pd.date_range('2019-01-01', periods=3, freq='D'),
+                                      'PREC': [1.0, 2.0, 3.0], 'TX': [20.0, 21.0, 22.0], 'TN': [10.0, 11.0, 12.0]})
+        self.realtime = pd.DataFrame({'DATE': ['2019-01-02', '2019-01-03', '2019-01-04'],
+                                      'TX': ['25', np.nan, '27'], 'TN': [15.0, 16.0, 17.0],
+                                      'HUM': [80, 80, 80], 'PREC_D': ['S/D', 6.0, 7.0]})
+
+    def test_000_realtime_first(self):
+        merged = merge.merge_series(self.historic, self.realtime)
+        self.assertEqual(list(merged.columns),
+                         ['DATE', 'PREC', 'TX', 'TN', 'SOURCE_PREC', 'SOURCE_TX', 'SOURCE_TN'])
+        self.assertEqual(len(merged), 4)
+        self.assertEqual(list(merged.TX), [20.0, 25.0, 22.0, 27.0])
+        self.assertEqual(list(merged.SOURCE_TX), ['historic', 'realtime', 'historic', 'realtime'])
+        self.assertEqual(list(merged.PREC), [1.0, 2.0, 6.0, 7.0])
+
+    def test_001_historic_first(self):
+        merged = merge.merge_series(self.historic, self.realtime, priority=('historic', 'realtime'))
+        self.assertEqual(list(merged.TN), [10.0, 11.0, 12.0, 17.0])
+        self.assertEqual(list(merged.SOURCE_TN), ['historic', 'historic', 'historic', 'realtime'])
+
+    def test_002_gaps(self):
+        historic = self.historic.iloc[[0]]
+        realtime = self.realtime.iloc[[2]]
+        merged = merge.merge_series(historic, realtime)
+        self.assertEqual(len(merged), 4)
+        self.assertTrue(np.isnan(merged.TX.iloc[1]))
+        self.assertIsNone(merged.SOURCE_TX.iloc[1])
+
+    def test_003_priority_without_data(self):
+        merged = merge.merge_series(None, self.realtime, priority=('historic',))
+        self.assertEqual(len(merged), 0)
+        merged = merge.merge_series(self.historic, self.realtime, priority=('historic',))
+        self.assertEqual(set(merged.SOURCE_TX), set(['historic']))
+
+    def test_004_bad_priority(self):
+        self.assertRaises(Exception, merge.merge_series, self.historic, self.realtime, priority=('senamhi',))
+        self.assertRaises(Exception, merge.merge_series, self.historic, self.realtime, priority='historic')
+
+
+class Test_merge_network(unittest.TestCase):
+
+    def test_000_codes(self):
+        new_to_old, old_to_new = merge.code_index()
+        self.assertEqual(new_to_old['100090'], '000396')
+        self.assertEqual(old_to_new['000396'], '100090')
+        historic = pd.DataFrame({'DATE': ['2019-01-01'], 'PREC': [1.0], 'TX': [20.0], 'TN': [10.0]})
+        merged = merge.merge_network(historic={'000396': historic, 'X1': historic},
+                                     realtime={'100090': historic.rename(columns={'PREC': 'PREC_D'})})
+        self.assertEqual(sorted(merged), ['100090', 'X1'])
+        self.assertEqual(merged['100090'].SOURCE_TX.iloc[0], 'realtime')
+        self.assertEqual(merged['X1'].SOURCE_TX.iloc[0], 'historic')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,8 @@
 """Tests for `phd_scraper` package."""
 
 
+import unittest
+
 import phd_scraper
 
 
@@ -19,6 +21,7 @@ class Test_se_historic(unittest.TestCase):
     def test_000_something(self):
         """Test something."""
 
+
 class se_hydrometeo(unittest.TestCase):
     """Tests for `phd_scraper` package."""
 
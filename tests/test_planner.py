@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `phd_scraper.planner` (requests.get is mocked)."""
+
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from phd_scraper import crawl
+from phd_scraper import planner
+from phd_scraper import se_hydrometeo
+from phd_scraper.cache import SharedCache
+
+from . import fakes
+
+
+class PlannerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.out_dir = os.path.join(self.tmp_dir, 'senamhi')
+        self.cache = SharedCache(os.path.join(self.tmp_dir, 'cache.sqlite'))
+        # The live altitude differs from the altitude of the metadata (431)
+        self.senamhi = fakes.FakeSenamhi(alt='440')
+        patcher = mock.patch('requests.get', side_effect=self.senamhi)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def new_files(self):
+        # Files of tmp_dir besides the cache of setUp
+        return sorted(name for name in os.listdir(self.tmp_dir) if not name.startswith('cache.sqlite'))
+
+    def kinds(self, requests):
+        return [(request.kind, request.station, request.month) for request in requests]
+
+
+class Test_plan(PlannerTestCase):
+
+    def test_000_without_cache(self):
+        requests = planner.plan(['100090'], '2019-01-01', '2019-02-28', historic=['000396'])
+        self.assertEqual(self.kinds(requests), [('altitude', '100090', '201901'), ('historic', '000396', None),
+                                                ('month', '100090', '201901'), ('altitude', '100090', '201902'),
+                                                ('month', '100090', '201902')])
+
+    def test_001_cache_skips_altitude_and_pages(self):
+        self.assertEqual(len(planner.plan(['100090'], '2019-01-01', '2019-03-31', cache=self.cache)), 4)
+        se_hydrometeo.download_one_month('100090', '2019-02-01', quiet=True, cache=self.cache, strict=True)
+        requests = planner.plan(['100090'], '2019-01-01', '2019-03-31', cache=self.cache)
+        self.assertEqual(self.kinds(requests), [('month', '100090', '201901'), ('month', '100090', '201903')])
+
+    def test_002_old_altitude_is_planned(self):
+        se_hydrometeo.download_one_month('100090', '2019-02-01', quiet=True, cache=self.cache, strict=True)
+        self.cache.altitude_max_age = -1
+        requests = planner.plan(['100090'], '2019-02-01', '2019-02-28', cache=self.cache)
+        self.assertEqual(self.kinds(requests), [('altitude', '100090', None)])
+
+    def test_003_plan_does_not_write(self):
+        se_hydrometeo.download_one_month('100090', '2019-02-01', quiet=True, cache=self.cache, strict=True)
+        self.cache.access_interval = 0
+        planner.plan(['100090'], '2019-01-01', '2019-03-31', cache=self.cache)
+        self.assertEqual(self.cache._touched, {})
+
+    def test_004_saved_months_are_skipped(self):
+        crawl.crawl(['100090'], '2019-01-01', '2019-02-28', self.out_dir)
+        requests = planner.plan(['100090', '106057'], '2019-01-01', '2019-03-31', cache=self.cache,
+                                out_dir=self.out_dir)
+        self.assertEqual(self.kinds(requests), [('altitude', '100090', None), ('month', '100090', '201903'),
+                                                ('altitude', '106057', None), ('month', '106057', '201901'),
+                                                ('month', '106057', '201902'), ('month', '106057', '201903')])
+
+    def test_005_unknown_station(self):
+        self.assertEqual(planner.plan(['999999'], '2019-01-01', '2019-01-31'), [])
+
+    def test_006_estimate(self):
+        requests = planner.plan(['100090'], '2019-01-01', '2019-02-28', cache=self.cache)
+        cost = planner.estimate(requests, workers=2, seconds_by_request=1.0)
+        self.assertEqual(cost['requests'], 3)
+        self.assertEqual(cost['by_kind'], {'altitude': 1, 'month': 2})
+        self.assertEqual(cost['stations'], 1)
+        self.assertEqual(cost['seconds'], 1.5)
+        self.assertEqual(self.senamhi.calls, [])
+
+    def test_007_missing_journal_is_not_created(self):
+        journal = os.path.join(self.tmp_dir, 'missing', 'journal.sqlite')
+        self.assertEqual(len(planner.plan(['100090'], '2019-01-01', '2019-01-31', journal=journal)), 2)
+        self.assertFalse(os.path.exists(os.path.dirname(journal)))
+
+    def test_008_journal_is_read_only(self):
+        journal = os.path.join(self.tmp_dir, 'journal.sqlite')
+        conn = sqlite3.connect(journal)
+        # Journal created before the coverage column
+        conn.execute('CREATE TABLE jobs (station TEXT, month TEXT, status TEXT, output TEXT, hash TEXT, '
+                     'error TEXT, updated TEXT, PRIMARY KEY (station, month))')
+        conn.execute("INSERT INTO jobs VALUES ('100090', '201901', 'done', NULL, NULL, NULL, NULL)")
+        conn.commit()
+        conn.close()
+        with open(journal, 'rb') as journal_file:
+            content = journal_file.read()
+        requests = planner.plan(['100090'], '2019-01-01', '2019-02-28', journal=journal)
+        self.assertEqual(self.kinds(requests), [('altitude', '100090', '201902'), ('month', '100090', '201902')])
+        with open(journal, 'rb') as journal_file:
+            self.assertEqual(journal_file.read(), content)
+        self.assertEqual(self.new_files(), ['journal.sqlite'])
+
+    def test_009_dry_run_command_does_not_write(self):
+        with mock.patch('sys.stdout'):
+            crawl.main(['--filter', 'cod=100090', '--init_date', '2019-01-01', '--last_date', '2019-01-31',
+                        '--out_dir', self.out_dir, '--cache_dir', os.path.join(self.tmp_dir, 'new_cache'),
+                        '--journal', os.path.join(self.tmp_dir, 'new', 'journal.sqlite'), '--dry_run'])
+        self.assertEqual(self.new_files(), [])
+
+
+class Test_order_jobs(PlannerTestCase):
+
+    def test_000_cached_months_first(self):
+        requests = [planner.Request('month', 'h', 'u', '1', '201902'),
+                    planner.Request('month', 'h', 'u', '2', '201901')]
+        jobs = [('1', '201901'), ('1', '201902'), ('2', '201901'), ('2', '201902')]
+        self.assertEqual(planner.order_jobs(jobs, requests),
+                         [('1', '201901'), ('2', '201902'), ('1', '201902'), ('2', '201901')])
+
+    def test_001_crawl_dispatches_in_plan_order(self):
+        se_hydrometeo.download_one_month('100090', '2019-02-01', quiet=True, cache=self.cache, strict=True)
+        with mock.patch.object(crawl, '_dispatch') as dispatch, \
+                mock.patch.object(crawl, 'SharedCache', return_value=self.cache):
+            crawl.crawl(['100090'], '2019-01-01', '2019-03-31', self.out_dir, cache_dir=self.tmp_dir)
+        self.assertEqual(dispatch.call_args[0][1], [('100090', '201902'), ('100090', '201901'), ('100090', '201903')])
+
+
+if __name__ == '__main__':
+    unittest.main()
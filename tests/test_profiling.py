@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `phd_scraper.profiling` (offline, over tests/fixtures/profiling)."""
+
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from phd_scraper import profiling
+
+from . import fakes
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'profiling')
+
+
+def report(station, stages, peak_bytes, kind='month'):
+    return {'kind': kind, 'station': station, 'month': '201901', 'peak_bytes': peak_bytes,
+            'stages': [{'stage': stage, 'peak_bytes': peak} for stage, peak in stages]}
+
+
+class Test_check_thresholds(unittest.TestCase):
+
+    def test_000_violations(self):
+        reports = [report('100090', [('fetch', 10), ('tables', 500)], 600),
+                   report('4726A602', [('fetch', 10), ('tables', 5000)], 6000)]
+        self.assertEqual(profiling.check_thresholds(reports, {'tables': 1000}),
+                         [('month', '4726A602', '201901', 'tables', 5000, 1000)])
+        # Station overrides replace the default thresholds
+        thresholds = {'peak_bytes': 1000, 'stations': {'4726A602': {'peak_bytes': 8000}}}
+        self.assertEqual(profiling.check_thresholds(reports, thresholds), [])
+        self.assertEqual(profiling.check_thresholds(reports), [])
+
+
+class Test_fixtures(unittest.TestCase):
+
+    def test_000_no_violations(self):
+        reports = profiling.profile_fixtures(FIXTURE_DIR)
+        self.assertEqual(sorted((rep['kind'], rep['station']) for rep in reports),
+                         [('historic', '000396'), ('month', '100090'), ('month', '106057'),
+                          ('month', '4726A602')])
+        for rep in reports:
+            self.assertGreater(rep['peak_bytes'], 0)
+        thresholds = profiling.read_thresholds(os.path.join(FIXTURE_DIR, 'thresholds.json'))
+        self.assertEqual(profiling.check_thresholds(reports, thresholds), [])
+
+    def test_001_order_does_not_matter(self):
+        # One-time costs of the process (metadata load, imports) are not charged to the first month
+        def peaks(names):
+            reports = {}
+            for name in names:
+                with open(os.path.join(FIXTURE_DIR, name + '.json')) as info_file:
+                    info = json.load(info_file)
+                with open(os.path.join(FIXTURE_DIR, name + '.html')) as html_file:
+                    report = profiling.profile_month(info['station'], info['date'], html=html_file.read(),
+                                                     station=info['metadata'])
+                reports[report['station']] = report['peak_bytes']
+            return reports
+        names = ['month_100090_201901', 'month_106057_201901']
+        first, second = peaks(names), peaks(names[::-1])
+        for station in ('100090', '106057'):
+            self.assertLess(abs(first[station] - second[station]), 0.1 * first[station])
+
+    def test_002_record_fixture(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        with mock.patch('requests.get', side_effect=fakes.FakeSenamhi()):
+            profiling.record_fixture(tmp_dir, station_code='100090', date='2019-01-01')
+            profiling.record_fixture(tmp_dir, station_code='000396', historic=True)
+        self.assertEqual(sorted(os.listdir(tmp_dir)), ['historic_000396.html', 'historic_000396.json',
+                                                       'month_100090_201901.html', 'month_100090_201901.json'])
+        reports = profiling.profile_fixtures(tmp_dir)
+        self.assertEqual([rep['station'] for rep in reports], ['000396', '100090'])
+        self.assertEqual([stage['stage'] for stage in reports[1]['stages']], ['fetch', 'tables', 'frame', 'format'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `phd_scraper.qc`."""
+
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from phd_scraper import qc
+
+
+class Test_checks(unittest.TestCase):
+
+    def test_000_range(self):
+        values = np.array([-50.0, 10.0, np.nan, 60.0])
+        self.assertEqual(list(qc.range_check(values, -30.0, 50.0)), [True, False, False, True])
+
+    def test_001_spike(self):
+        values = np.array([10.0, 11.0, 40.0, 12.0, 13.0, 40.0, 41.0])
+        # 40 jumps away from both neighbours; the step 13 -> 40 -> 41 is not a spike
+        self.assertEqual(list(qc.spike_check(values, 15.0)), [False, False, True, False, False, False, False])
+        self.assertFalse(qc.spike_check(np.array([1.0, 50.0]), 15.0).any())
+
+    def test_002_flat_line(self):
+        values = np.array([1.0, 2.0, 2.0, 2.0, 3.0, np.nan, np.nan, np.nan])
+        self.assertEqual(list(qc.flat_line_check(values, 3)), [False, True, True, True, False, False, False, False])
+
+    def test_003_flat_line_does_not_cross_stations(self):
+        # Column 0 ends with 5.0 and column 1 starts with 5.0: they are different runs
+        cube = np.array([[1.0, 5.0], [5.0, 5.0], [5.0, 6.0]])
+        flags = qc.flat_line_check(cube, 3)
+        self.assertFalse(flags.any())
+        self.assertEqual(flags.shape, cube.shape)
+
+
+class Test_quality_control(unittest.TestCase):
+
+    def test_000_station_bits(self):
+        station_data = pd.DataFrame({
+            'DATE': pd.date_range('2019-01-01', periods=10, freq='D'),
+            'TX': [20.0, 21.0, 55.0, 22.0, 22.0, 22.0, 22.0, 22.0, 22.0, 22.0],
+            'TN': [10.0, 11.0, 10.0, 25.0, 10.0, 11.0, 10.0, 11.0, np.nan, 10.0],
+            'HUM': ['80', '81', 'S/D', '82', '120', '83', '84', '85', '86', '87'],
+        })
+        flags = qc.quality_control(station_data, flat_lengths={'TX': 7})
+        self.assertEqual(sorted(flags), ['HUM', 'TN', 'TX'])
+        self.assertEqual(flags['TX'].dtype, np.uint8)
+        self.assertEqual(flags['TX'][2], qc.RANGE | qc.SPIKE)
+        self.assertEqual(flags['TX'][3], qc.TX_LT_TN | qc.FLAT)
+        self.assertEqual(flags['TN'][3], qc.TX_LT_TN)
+        self.assertTrue((flags['TX'][4:] == qc.FLAT).all())
+        self.assertEqual(flags['HUM'][4], qc.RANGE)
+        self.assertEqual(list(flags['HUM'][[0, 2]]), [0, 0])
+        self.assertEqual(flags['TN'][8], 0)
+
+    def test_001_cube(self):
+        frames = {
+            'A': pd.DataFrame({'DATE': ['2019-01-01', '2019-01-02', '2019-01-03'], 'TX': [20.0, 60.0, 21.0]}),
+            'B': pd.DataFrame({'DATE': ['2019-01-02', '2019-01-03'], 'TX': [15.0, 16.0]}),
+        }
+        dates, stations, cube = qc.station_cube(frames, 'TX')
+        self.assertEqual(stations, ['A', 'B'])
+        self.assertEqual(cube.shape, (3, 2))
+        self.assertTrue(np.isnan(cube[0, 1]))
+        flags = qc.quality_control({'TX': cube})['TX']
+        self.assertEqual(flags.shape, (3, 2))
+        self.assertEqual(flags[1, 0], qc.RANGE | qc.SPIKE)
+        self.assertFalse(flags[:, 1].any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `phd_scraper.rollup`."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from phd_scraper import rollup
+
+
+class Test_rollup(unittest.TestCase):
+
+    def setUp(self):
+        # Two days of hourly data (the second day has missing values)
+        self.hourly = pd.DataFrame({
+            'DATE': ['2019-01-01'] * 24 + ['2019-01-02'] * 24,
+            'HOUR': ['%02d:00:00' % hour for hour in range(24)] * 2,
+            'TEMP': [float(hour) for hour in range(24)] + [np.nan] * 23 + [5.0],
+            'PREC_H': [0.5] * 24 + [np.nan] * 24,
+        })
+
+    def test_000_daily(self):
+        daily = rollup.rollup(self.hourly, freq='D')
+        self.assertEqual(list(daily.DATE), list(pd.to_datetime(['2019-01-01', '2019-01-02'])))
+        self.assertEqual(daily.PREC_H_SUM.iloc[0], 12.0)
+        self.assertTrue(np.isnan(daily.PREC_H_SUM.iloc[1]))
+        self.assertEqual(list(daily.PREC_H_COUNT), [24, 0])
+        self.assertEqual(list(daily.TEMP_MEAN), [11.5, 5.0])
+        self.assertEqual(list(daily.TEMP_MIN), [0.0, 5.0])
+        self.assertEqual(list(daily.TEMP_MAX), [23.0, 5.0])
+        self.assertEqual(list(daily.TEMP_COUNT), [24, 1])
+
+    def test_001_monthly(self):
+        daily = pd.DataFrame({'DATE': pd.date_range('2019-01-30', '2019-02-02', freq='D'),
+                              'TX': [20.0, 22.0, np.nan, 24.0],
+                              'PREC_D': [1.0, 2.0, 3.0, np.nan]})
+        monthly = rollup.rollup(daily, freq='M')
+        self.assertEqual(list(monthly.DATE), list(pd.to_datetime(['2019-01-01', '2019-02-01'])))
+        self.assertEqual(list(monthly.PREC_D_SUM), [3.0, 3.0])
+        self.assertEqual(list(monthly.PREC_D_COUNT), [2, 1])
+        self.assertEqual(list(monthly.TX_MEAN), [21.0, 24.0])
+        self.assertEqual(list(monthly.TX_COUNT), [2, 1])
+
+    def test_002_empty(self):
+        empty = rollup.rollup(pd.DataFrame({'DATE': [], 'TX': []}), freq='D')
+        self.assertEqual(len(empty), 0)
+
+    def test_003_bad_freq(self):
+        self.assertRaises(Exception, rollup.rollup, self.hourly, 'H')
+
+    def test_004_save_rollups(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        filenames = rollup.save_rollups(self.hourly, os.path.join(tmp_dir, 'station.csv'))
+        self.assertEqual([os.path.basename(filename) for filename in filenames],
+                         ['station.daily.csv', 'station.monthly.csv'])
+        self.assertEqual(len(pd.read_csv(filenames[1])), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `phd_scraper.se_historic` (requests.get is mocked)."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from phd_scraper import se_historic
+from phd_scraper.cache import SharedCache
+
+from . import fakes
+
+
+class Test_download(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.cache = SharedCache(os.path.join(self.tmp_dir, 'cache.sqlite'))
+        self.senamhi = fakes.FakeSenamhi()
+        patcher = mock.patch('requests.get', side_effect=self.senamhi)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_000_parse(self):
+        data_station = se_historic.download('000396')
+        self.assertEqual(list(data_station.columns), ['DATE', 'PREC', 'TX', 'TN'])
+        self.assertEqual(len(data_station), 365)
+        self.assertEqual(str(data_station.DATE.iloc[-1].date()), '2018-12-31')
+
+    def test_001_cache(self):
+        first = se_historic.download('000396', cache=self.cache)
+        with mock.patch.object(se_historic, 'parse_historic') as parse:
+            second = se_historic.download('000396', cache=self.cache)
+        parse.assert_not_called()
+        self.assertEqual(len(self.senamhi.calls), 1)
+        self.assertTrue(first.equals(second))
+
+    def test_002_http_error_is_not_cached(self):
+        with mock.patch('requests.get', return_value=fakes.FakeResponse('<html></html>', 502)):
+            self.assertRaises(Exception, se_historic.download, '000396', cache=self.cache)
+        self.assertFalse(self.cache.contains('historic', se_historic.historic_url('000396')))
+        self.assertEqual(len(se_historic.download('000396', cache=self.cache)), 365)
+        self.assertEqual(len(self.senamhi.calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `phd_scraper.se_hydrometeo` (requests.get is mocked)."""
+
+
+import os
+import pickle
+import shutil
+import time
+import tempfile
+import unittest
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from phd_scraper import se_hydrometeo
+from phd_scraper.cache import ParseCache, SharedCache
+
+from . import fakes
+
+
+class Test_download_days(unittest.TestCase):
+    """download_days: one request by (station, month) and the requested days sliced."""
+
+    def setUp(self):
+        self.senamhi = fakes.FakeSenamhi()
+        patcher = mock.patch('requests.get', side_effect=self.senamhi)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_000_slices_requested_days(self):
+        days = ['2019-01-10', '2019-01-03', '2019-02-01', '2019-01-10']
+        data = se_hydrometeo.download_days(['100090', '106057'], days, quiet=True)
+        self.assertEqual(sorted(data), ['100090', '106057'])
+        for station_data in data.values():
+            dates = list(station_data.DATE.dt.strftime('%Y-%m-%d'))
+            self.assertEqual(dates, ['2019-01-03', '2019-01-10', '2019-02-01'])
+            self.assertEqual(list(station_data.columns), ['DATE', 'TX', 'TN', 'HUM', 'PREC_D'])
+
+    def test_001_one_request_by_station_month(self):
+        se_hydrometeo.download_days(['100090', '106057'], ['2019-01-03', '2019-01-10', '2019-02-01'],
+                                    quiet=True)
+        months = self.senamhi.month_calls()
+        self.assertEqual(len(months), 4)
+        self.assertEqual(len(set(months)), 4)
+
+    def test_002_missing_day_is_nan(self):
+        self.senamhi.missing_days = {'201901': (10,)}
+        data = se_hydrometeo.download_days(['100090'], ['2019-01-10', '2019-01-11'], quiet=True)['100090']
+        self.assertEqual(len(data), 2)
+        self.assertTrue(data.TX.isnull().iloc[0])
+        self.assertFalse(data.TX.isnull().iloc[1])
+
+
+class Test_parse_cache(unittest.TestCase):
+    """download(parse_cache=...): unchanged pages are not parsed again and to_csv is not rewritten."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.senamhi = fakes.FakeSenamhi()
+        patcher = mock.patch('requests.get', side_effect=self.senamhi)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.parse_cache = ParseCache(os.path.join(self.tmp_dir, 'parse'))
+        self.to_csv = os.path.join(self.tmp_dir, '100090.csv')
+
+    def _download(self, station_code='100090', last_date='2019-02-28'):
+        with mock.patch.object(se_hydrometeo, 'parse_senamhi_realtime',
+                               wraps=se_hydrometeo.parse_senamhi_realtime) as parse:
+            se_hydrometeo.download(station_code, '2019-01-01', last_date, to_csv=self.to_csv, quiet=True,
+                                   parse_cache=self.parse_cache)
+        return parse.call_count
+
+    def _rows(self):
+        with open(self.to_csv) as csv_file:
+            return len(csv_file.readlines()) - 1
+
+    def test_000_miss_then_hit(self):
+        self.assertEqual(self._download(), 2)
+        self.assertEqual(self._download(), 0)
+
+    def test_001_unchanged_output_is_not_rewritten(self):
+        self._download()
+        with mock.patch('pandas.DataFrame.to_csv') as to_csv:
+            self._download()
+        to_csv.assert_not_called()
+
+    def test_002_changed_page_is_parsed_and_written(self):
+        self._download()
+        self.senamhi.missing_days = {'201902': (3,)}
+        with mock.patch('pandas.DataFrame.to_csv') as to_csv:
+            self.assertEqual(self._download(), 1)
+        to_csv.assert_called_once()
+
+    def test_003_other_query_is_written(self):
+        # Same cached pages, but the file holds the output of another query
+        self._download()
+        self.assertEqual(self._rows(), 31 + 28)
+        self._download(last_date='2019-01-31')
+        self.assertEqual(self._rows(), 31)
+        self._download()
+        self.assertEqual(self._rows(), 31 + 28)
+        self._download(station_code='106057')
+        with mock.patch('pandas.DataFrame.to_csv') as to_csv:
+            self._download(station_code='106057')
+        to_csv.assert_not_called()
+        with mock.patch('pandas.DataFrame.to_csv') as to_csv:
+            self._download()
+        to_csv.assert_called_once()
+
+    def test_004_failed_month_is_always_written(self):
+        self.senamhi.status = {'201902': 503}
+        self._download()
+        self.assertFalse(os.path.exists(self.to_csv + '.sha1'))
+        with mock.patch('pandas.DataFrame.to_csv') as to_csv:
+            self._download()
+        to_csv.assert_called_once()
+
+    def test_005_quiet(self):
+        self._download()
+        with mock.patch('sys.stdout') as stdout:
+            self._download()
+        self.assertNotIn('Unchanged', ''.join(str(call) for call in stdout.write.call_args_list))
+
+
+class Test_download_rollups(unittest.TestCase):
+    """download(rollups=True): the aggregates are written when they are missing."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.senamhi = fakes.FakeSenamhi()
+        patcher = mock.patch('requests.get', side_effect=self.senamhi)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = SharedCache(os.path.join(self.tmp_dir, 'cache.sqlite'))
+        self.to_csv = os.path.join(self.tmp_dir, '4726A602.csv')
+        self.rollup_files = [os.path.join(self.tmp_dir, '4726A602.%s.csv' % freq) for freq in ('daily', 'monthly')]
+
+    def _download(self, rollups, last_date='2019-01-31'):
+        se_hydrometeo.download('4726A602', '2019-01-01', last_date, to_csv=self.to_csv, quiet=True,
+                               cache=self.cache, rollups=rollups)
+
+    def test_000_unchanged_file_without_rollups(self):
+        self._download(rollups=False)
+        self._download(rollups=True)
+        self.assertTrue(all(os.path.exists(filename) for filename in self.rollup_files))
+
+    def test_001_stale_rollups_are_removed(self):
+        self._download(rollups=True)
+        self._download(rollups=False, last_date='2019-02-28')
+        self.assertFalse(any(os.path.exists(filename) for filename in self.rollup_files))
+
+    def test_002_needs_to_csv(self):
+        self.assertRaises(Exception, se_hydrometeo.download, '4726A602', '2019-01-01', '2019-01-31',
+                          quiet=True, rollups=True)
+        self.assertEqual(self.senamhi.calls, [])
+
+
+class Test_metadata(unittest.TestCase):
+    """diff_metadata and refresh_metadata."""
+
+    old = [{'cod': '1', 'estado': 'REAL', 'alt': '100'},
+           {'cod': '2', 'estado': 'REAL', 'alt': '200'},
+           {'cod': '3', 'estado': 'DIFERIDO', 'alt': '300'}]
+
+    def test_000_diff_metadata(self):
+        new = [{'cod': '1', 'estado': 'REAL', 'alt': '100'},
+               {'cod': '2', 'estado': 'AUTOMATICA', 'alt': '210'},
+               {'cod': '4', 'estado': 'REAL', 'alt': '400'}]
+        diff = se_hydrometeo.diff_metadata(self.old, new)
+        self.assertEqual(diff['added'], ['4'])
+        self.assertEqual(diff['removed'], ['3'])
+        self.assertEqual(diff['changed'], {'2': {'estado': ('REAL', 'AUTOMATICA'), 'alt': ('200', '210')}})
+
+    def test_001_diff_metadata_unchanged(self):
+        self.assertEqual(se_hydrometeo.diff_metadata(self.old, list(self.old)),
+                         {'added': [], 'removed': [], 'changed': {}})
+
+    def test_002_refresh_metadata(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        metadata_db = os.path.join(tmp_dir, 'se_hydrometeo.dictionary')
+        with open(metadata_db, 'wb') as metadata_file:
+            pickle.dump(self.old, metadata_file)
+        stations = [{'cod': '1', 'estado': 'REAL', 'ico': 'M', 'cate': 'CO'},
+                    {'cod': '2', 'estado': 'REAL', 'ico': 'M', 'cate': 'CO'}]
+
+        def get(url, *args, **kwargs):
+            # The altitude of the station 2 is not available: the previous one is kept
+            if 'cod=2&' in url:
+                return fakes.FakeResponse('<html></html>', 500, url=url)
+            return fakes.FakeResponse(fakes.altitude_page('150'), url=url)
+
+        with mock.patch('requests.get', side_effect=get):
+            filename, diff = se_hydrometeo.refresh_metadata(metadata_db, stations=stations, workers=2, quiet=True)
+        with open(filename, 'rb') as metadata_file:
+            new = pickle.load(metadata_file)
+        self.assertEqual([(dic['cod'], dic['alt']) for dic in new], [('1', '150'), ('2', '200')])
+        self.assertEqual(diff['removed'], ['3'])
+        self.assertEqual(sorted(diff['changed']), ['1', '2'])
+
+
+class Test_read_metadata(unittest.TestCase):
+
+    def test_000_concurrent_reads_of_several_files(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        filenames = []
+        for n in range(4):
+            filenames.append(os.path.join(tmp_dir, '%s.dictionary' % n))
+            with open(filenames[-1], 'wb') as metadata_file:
+                pickle.dump([{'cod': str(n)}], metadata_file)
+        # Each file evicts the previous one from the cache of the module
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(se_hydrometeo.read_metadata, filenames * 200))
+        self.assertEqual([metadata[0]['cod'] for metadata in results], ['0', '1', '2', '3'] * 200)
+
+
+class Test_shared_cache(unittest.TestCase):
+    """Just pages without HTTP errors that are parsed without errors are saved in SharedCache."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.cache = SharedCache(os.path.join(self.tmp_dir, 'cache.sqlite'))
+        self.senamhi = fakes.FakeSenamhi()
+        patcher = mock.patch('requests.get', side_effect=self.senamhi)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _download(self, strict=True):
+        return se_hydrometeo.download_one_month('100090', '2019-01-01', quiet=True, cache=self.cache, strict=strict)
+
+    def test_000_page_is_reused(self):
+        first = self._download()
+        second = self._download()
+        self.assertEqual(len(self.senamhi.month_calls()), 1)
+        self.assertTrue(first.equals(second))
+
+    def test_001_http_error_is_not_cached(self):
+        self.senamhi.status = {'201901': 503}
+        self.assertRaises(Exception, self._download)
+        self._download(strict=False)
+        self.senamhi.status = {}
+        self.assertEqual(self._download().TX.notnull().sum(), 31)
+        self.assertEqual(len(self.senamhi.month_calls()), 3)
+
+    def test_002_unparsable_page_is_not_cached(self):
+        self.senamhi.pages = {'201901': '<html>Mantenimiento</html>'}
+        self.assertRaises(Exception, self._download)
+        self.senamhi.pages = {}
+        self.assertEqual(self._download().TX.notnull().sum(), 31)
+        self.assertEqual(len(self.senamhi.month_calls()), 2)
+
+    def test_003_open_months_are_downloaded_again(self):
+        today = datetime.now()
+        date = today.strftime('%Y-%m-01')
+        for _ in range(2):
+            se_hydrometeo.download_one_month('100090', date, quiet=True, cache=self.cache, strict=True)
+        self.assertEqual(len(self.senamhi.month_calls()), 2)
+        self.cache.open_month_max_age = 3600
+        se_hydrometeo.download_one_month('100090', date, quiet=True, cache=self.cache, strict=True)
+        self.assertEqual(len(self.senamhi.month_calls()), 2)
+
+    def test_004_response_max_age(self):
+        today = datetime(2020, 1, 15)
+        for year_month, max_age in (('202001', 0), ('201912', 0), ('201911', self.cache.response_max_age)):
+            self.assertEqual(se_hydrometeo.response_max_age(self.cache, year_month, today=today), max_age)
+
+    def test_005_altitude(self):
+        args = ('100090', 'DIFERIDO', 'M', 'CO', '000396')
+        with mock.patch('requests.get', return_value=fakes.FakeResponse('<html></html>', 500)):
+            self.assertRaises(Exception, se_hydrometeo.add_altitude, *args, cache=self.cache)
+        with mock.patch('requests.get', return_value=fakes.FakeResponse('<table><tr><td>-</td></tr></table>')):
+            self.assertRaises(Exception, se_hydrometeo.add_altitude, *args, cache=self.cache)
+        self.assertEqual(se_hydrometeo.add_altitude(*args, cache=self.cache), '431')
+        self.assertEqual(se_hydrometeo.add_altitude(*args, cache=self.cache), '431')
+        self.assertEqual(len(self.senamhi.calls), 1)
+        # Old altitudes are downloaded again
+        self.cache.altitude_max_age = 0.01
+        time.sleep(0.05)
+        self.senamhi.alt = '432'
+        self.assertEqual(se_hydrometeo.add_altitude(*args, cache=self.cache), '432')
+
+
+if __name__ == '__main__':
+    unittest.main()